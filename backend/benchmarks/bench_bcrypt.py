@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bcrypt cost vs login throughput on this host
+For each work factor, hashes for SECONDS on one thread and on one thread per
+core, and reports latency per hash and hashes/second per core. Also prints
+the cost the server's startup calibration would pick for --target-ms.
+
+Usage (from backend/): python benchmarks/bench_bcrypt.py [--rounds 10 11 12 13] [--target-ms 250]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import bcrypt
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.password_hasher import calibrate_bcrypt_rounds  # noqa: E402
+
+
+def hash_for(seconds: float, rounds: int) -> int:
+    """Number of hashes one thread completes in `seconds`"""
+    salt = bcrypt.gensalt(rounds)
+    deadline = time.perf_counter() + seconds
+    count = 0
+    while time.perf_counter() < deadline:
+        bcrypt.hashpw(b"benchmark-password", salt)
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12, 13])
+    parser.add_argument("--seconds", type=float, default=2.0, help="Measurement time per cost")
+    parser.add_argument("--target-ms", type=float, default=250.0, help="Latency target for calibration")
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    print(f"{cores} cores")
+    print(f"{'rounds':>6} {'ms/hash':>9} {'1 thread/s':>11} {f'{cores} threads/s':>13} {'per core/s':>11}")
+    for rounds in args.rounds:
+        single = hash_for(args.seconds, rounds)
+        with ThreadPoolExecutor(max_workers=cores) as pool:
+            parallel = sum(pool.map(hash_for, [args.seconds] * cores, [rounds] * cores))
+        print(f"{rounds:>6} {args.seconds / single * 1000:>9.1f} {single / args.seconds:>11.1f} "
+              f"{parallel / args.seconds:>13.1f} {parallel / args.seconds / cores:>11.1f}")
+
+    rounds, measured_ms = calibrate_bcrypt_rounds(args.target_ms)
+    print(f"calibration for {args.target_ms:.0f} ms target: cost {rounds} ({measured_ms:.0f} ms per hash)")
+
+
+if __name__ == "__main__":
+    main()
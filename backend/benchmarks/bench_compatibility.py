@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark: scalar vs vectorized compatibility scoring
+Scores one user against synthetic candidate blocks with both scorers.
+Candidates carry stored `trait_codes`, as users do after submit_assessment
+(or manage.py encode-traits). Identity of the two scorers is covered by
+tests/test_compatibility.py.
+
+Usage (from backend/): python benchmarks/bench_compatibility.py
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.compatibility import (  # noqa: E402
+    MBTI_CODES,
+    TRAIT_VOCABULARY,
+    TraitBlock,
+    calculate_compatibility_score,
+    encode_traits,
+    score_block,
+)
+
+BLOCK_SIZES = [1_000, 10_000, 50_000, 100_000]
+
+
+def random_user(rng: random.Random) -> dict:
+    user = {"mbti": rng.choice(list(MBTI_CODES)), "readiness": rng.choice([0, rng.uniform(0, 100)])}
+    for trait, vocabulary in TRAIT_VOCABULARY.items():
+        user[trait] = rng.choice(list(vocabulary))
+    user["trait_codes"] = encode_traits(user)
+    return user
+
+
+def main():
+    rng = random.Random(42)
+    me = random_user(rng)
+    me_block = TraitBlock([me])
+
+    print(f"{'candidates':>10} {'scalar ms':>10} {'encode ms':>10} {'score ms':>10} {'vector ms':>10}")
+    for n in BLOCK_SIZES:
+        candidates = [random_user(rng) for _ in range(n)]
+
+        start = time.perf_counter()
+        expected = [calculate_compatibility_score(me, c) for c in candidates]
+        scalar_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        block = TraitBlock(candidates)
+        encode_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        scores = score_block(me_block, block)
+        score_ms = (time.perf_counter() - start) * 1000
+
+        assert scores.tolist() == expected, "vectorized scores differ from scalar scores"
+        print(f"{n:>10} {scalar_ms:>10.1f} {encode_ms:>10.1f} {score_ms:>10.1f} {encode_ms + score_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
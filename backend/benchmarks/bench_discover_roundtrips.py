@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark: MongoDB round trips per /api/discover request
+Seeds N nearby users (and likes to half of them) into a scratch database,
+then counts the commands discover_users sends for each candidate count.
+
+Usage (from backend/): python benchmarks/bench_discover_roundtrips.py
+Requires a running MongoDB at MONGO_URL.
+"""
+
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+from pymongo import monitoring
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ["DB_NAME"] = os.environ.get("BENCH_DB_NAME", "miluv_bench")
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands sent to the server (getMore included)"""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+counter = CommandCounter()
+monitoring.register(counter)
+
+import server  # noqa: E402  (listener must be registered before the client exists)
+
+CANDIDATE_COUNTS = [10, 100, 500, 2000]
+BASE_LAT, BASE_LON = -6.2088, 106.8456
+
+
+def make_user(i: int) -> dict:
+    lat = BASE_LAT + (i % 100) * 0.001
+    lon = BASE_LON + (i // 100) * 0.001
+    return {
+        "name": f"Bench User {i}",
+        "email": f"bench{i}@miluv.com",
+        "password_hash": "x",
+        "date_of_birth": "1995-06-15",
+        "gender": "female" if i % 2 else "male",
+        "username": f"bench{i}",
+        "profile_photos": [""],
+        "verified_face": True,
+        "latitude": lat,
+        "longitude": lon,
+        "location": server.geo_point(lat, lon),
+        "mbti": "INTJ" if i % 2 else "ENFP",
+        "love_language": "Quality Time",
+        "readiness": 80,
+        "temperament": "Sanguine",
+        "disc": "Influence",
+        "assessments_completed": True,
+        "blocked_users": [],
+    }
+
+
+async def run():
+    db = server.db
+    print(f"{'candidates':>10} {'round trips':>12} {'ms':>8}")
+    for n in CANDIDATE_COUNTS:
+        await server.client.drop_database(db.name)
+        await db.users.create_index([("location", "2dsphere")])
+
+        me = make_user(-1)
+        me_id = (await db.users.insert_one(me)).inserted_id
+        me["id"] = str(me_id)
+        result = await db.users.insert_many([make_user(i) for i in range(n)])
+        liked = result.inserted_ids[::2]
+        await db.likes.insert_many([
+            {"from_user_id": me["id"], "to_user_id": str(uid)}
+            for uid in liked
+        ])
+
+        counter.count = 0
+        start = time.perf_counter()
+        response = await server.discover_users(radius=1000, page=1, limit=20, current_user=me)
+        elapsed = (time.perf_counter() - start) * 1000
+
+        # Liked users are filtered out, and so are the few unliked ones the
+        # seen filter reports as false positives
+        seen = await server.seen_store.get(me["id"])
+        unliked = result.inserted_ids[1::2]
+        expected = sum(1 for uid in unliked if str(uid) not in seen)
+        assert response["total"] == expected, (response["total"], expected)
+        print(f"{n:>10} {counter.count:>12} {elapsed:>8.1f}")
+
+    await server.client.drop_database(db.name)
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
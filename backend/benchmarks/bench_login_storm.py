@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Load test: latency of an unrelated endpoint during a login storm
+Probes GET /api/ on the real ASGI app every few milliseconds while CONCURRENCY
+tasks verify bcrypt passwords in a loop, in three phases:
+  idle    no storm
+  inline  pwd_context.verify called on the event loop (the old login path)
+  pool    server.verify_password, i.e. the bounded PasswordHasher pool
+With the pool the probe's p99 should stay close to idle; inline every probe
+waits behind a run of back-to-back bcrypt calls. No MongoDB needed (startup
+hooks are not run).
+
+Usage (from backend/): python benchmarks/bench_login_storm.py [--duration 3] [--concurrency 50]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import server  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+
+PROBE_INTERVAL = 0.005  # seconds
+
+
+async def asgi_get(path: str) -> int:
+    """One GET through the ASGI app, returns the status code"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 12345), "server": ("bench", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await server.app(scope, receive, send)
+    return status
+
+
+async def probe(stop: asyncio.Event, latencies: list):
+    """Latency counted from when the request was due, so time spent waiting
+    for a blocked event loop to get around to it is included"""
+    due = time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(max(0.0, due - time.perf_counter()))
+        await asgi_get("/api/")
+        finished = time.perf_counter()
+        latencies.append((finished - due) * 1000)
+        due = max(due + PROBE_INTERVAL, finished)
+
+
+async def storm_worker(stop: asyncio.Event, mode: str, password_hash: str, counts: dict):
+    while not stop.is_set():
+        try:
+            if mode == "inline":
+                server.pwd_context.verify("miluv123", password_hash)
+                await asyncio.sleep(0)
+            else:
+                await server.verify_password("miluv123", password_hash)
+            counts["ok"] += 1
+        except HTTPException:
+            counts["shed"] += 1
+            await asyncio.sleep(0.05)  # client backs off on 503
+
+
+async def run_phase(mode: str, duration: float, concurrency: int, password_hash: str) -> dict:
+    stop = asyncio.Event()
+    latencies = []
+    counts = {"ok": 0, "shed": 0}
+    tasks = [asyncio.create_task(probe(stop, latencies))]
+    if mode != "idle":
+        tasks += [
+            asyncio.create_task(storm_worker(stop, mode, password_hash, counts))
+            for _ in range(concurrency)
+        ]
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "probes": len(latencies),
+        "p50": statistics.median(latencies),
+        "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "max": latencies[-1],
+        "logins": counts["ok"],
+        "shed": counts["shed"],
+    }
+
+
+async def main(args):
+    password_hash = server.pwd_context.hash("miluv123")
+    print(f"bcrypt workers={server.password_hasher.max_workers} max_queue={server.password_hasher.max_queue}")
+    print(f"{'phase':>7} {'probes':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'logins':>7} {'shed':>6}")
+    for mode in ("idle", "inline", "pool"):
+        r = await run_phase(mode, args.duration, args.concurrency, password_hash)
+        print(f"{r['mode']:>7} {r['probes']:>7} {r['p50']:>8.2f} {r['p99']:>8.2f} {r['max']:>8.2f} "
+              f"{r['logins']:>7} {r['shed']:>6}")
+    server.password_hasher.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per phase")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent login loops")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark: socket connect/disconnect bookkeeping, ConnectionIndex vs linear scans
+Simulates a mass reconnect: CONNECTIONS sockets (users with 1-3 devices)
+connect and join 1-3 chat rooms each, then all disconnect in random order.
+The legacy path is the old socket_service logic (user -> sid dict scanned for
+the sid, then every room scanned for the user); it is quadratic, so it only
+runs up to --legacy-max connections.
+
+Usage (from backend/): python benchmarks/bench_socket_connections.py [--sizes 1000 10000 100000] [--legacy-max 20000]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.connection_index import ConnectionIndex  # noqa: E402
+
+
+def make_workload(connections: int, seed: int = 7):
+    """[(sid, user_id, rooms)] with ~1.5 devices per user and ~2 rooms per sid"""
+    rng = random.Random(seed)
+    users = max(1, int(connections / 1.5))
+    rooms = max(1, users // 2)
+    return [
+        (f"sid{i}", f"user{rng.randrange(users)}",
+         [f"match{rng.randrange(rooms)}" for _ in range(rng.randint(1, 3))])
+        for i in range(connections)
+    ]
+
+
+def run_index(workload) -> tuple:
+    index = ConnectionIndex()
+    started = time.perf_counter()
+    for sid, user_id, rooms in workload:
+        index.connect(sid, user_id)
+        for room in rooms:
+            index.join(sid, room, user_id)
+    connected_at = time.perf_counter()
+
+    order = list(workload)
+    random.Random(1).shuffle(order)
+    for sid, _, _ in order:
+        index.disconnect(sid)
+    finished = time.perf_counter()
+    assert index.stats() == {"sids": 0, "users": 0, "rooms": 0}, index.stats()
+    return connected_at - started, finished - connected_at
+
+
+def run_legacy(workload) -> tuple:
+    """The pre-index socket_service bookkeeping (one sid per user)"""
+    active_users = {}
+    match_rooms = {}
+    started = time.perf_counter()
+    for sid, user_id, rooms in workload:
+        active_users[user_id] = sid
+        for room in rooms:
+            match_rooms.setdefault(room, set()).add(user_id)
+    connected_at = time.perf_counter()
+
+    order = list(workload)
+    random.Random(1).shuffle(order)
+    for sid, _, _ in order:
+        user_id = None
+        for uid, user_sid in active_users.items():
+            if user_sid == sid:
+                user_id = uid
+                break
+        if user_id:
+            del active_users[user_id]
+            for users in match_rooms.values():
+                if user_id in users:
+                    users.remove(user_id)
+    finished = time.perf_counter()
+    return connected_at - started, finished - connected_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--legacy-max", type=int, default=20000, help="Skip the linear scan above this size")
+    args = parser.parse_args()
+
+    print(f"{'sockets':>8} {'method':>7} {'connect ms':>11} {'disconnect ms':>14} {'us/disconnect':>14}")
+    for size in args.sizes:
+        workload = make_workload(size)
+        for method, run in (("index", run_index), ("legacy", run_legacy)):
+            if method == "legacy" and size > args.legacy_max:
+                print(f"{size:>8} {method:>7} {'skipped (quadratic)':>41}")
+                continue
+            connect_s, disconnect_s = run(workload)
+            print(f"{size:>8} {method:>7} {connect_s * 1000:>11.1f} {disconnect_s * 1000:>14.1f} "
+                  f"{disconnect_s / size * 1e6:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bytes transferred per users-collection read, with and without
+the per-endpoint projections in services/user_repository.py
+Seeds users carrying realistic base64 photos into a scratch database and
+compares the BSON size of full documents with each projected view.
+
+Usage (from backend/): python benchmarks/bench_user_projections.py
+Requires a running MongoDB at MONGO_URL.
+"""
+
+import asyncio
+import base64
+import os
+import sys
+from pathlib import Path
+
+import bson
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+
+from services.user_repository import UserRepository  # noqa: E402
+
+USERS = 200
+PHOTO_BYTES = 150_000  # a typical phone JPEG
+PHOTOS_PER_USER = 3
+
+# Endpoint -> view used on its hot path
+ENDPOINT_VIEWS = {
+    "get_current_user": "current_user",
+    "get_matches (per row)": "list_row",
+    "get_feeds (per row)": "list_row",
+    "get_user_profile": "public_profile",
+    "discover (ranking)": "ranking",
+}
+
+
+def make_user(i: int) -> dict:
+    photo = base64.b64encode(os.urandom(PHOTO_BYTES)).decode()
+    return {
+        "name": f"Bench User {i}",
+        "email": f"bench{i}@miluv.com",
+        "password_hash": "$2b$12$" + "x" * 53,
+        "date_of_birth": "1995-06-15",
+        "gender": "female",
+        "username": f"bench{i}",
+        "profile_photos": [photo] * PHOTOS_PER_USER,
+        "selfie_photo": photo,
+        "verified_face": True,
+        "latitude": -6.2, "longitude": 106.8,
+        "mbti": "INTJ", "love_language": "Gifts", "readiness": 80,
+        "temperament": "Sanguine", "disc": "Influence",
+        "assessments_completed": True, "blocked_users": [], "bio": "",
+    }
+
+
+async def run():
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ.get("BENCH_DB_NAME", "miluv_bench")]
+    await db.users.drop()
+    await db.users.insert_many([make_user(i) for i in range(USERS)])
+    repo = UserRepository(db)
+
+    full = await db.users.find({}).to_list(None)
+    full_bytes = sum(len(bson.encode(doc)) for doc in full) / len(full)
+
+    print(f"{'endpoint':<24} {'before B':>10} {'after B':>10} {'ratio':>8}")
+    for endpoint, view in ENDPOINT_VIEWS.items():
+        projected = await repo.find({}, view).to_list(None)
+        after = sum(len(bson.encode(doc)) for doc in projected) / len(projected)
+        print(f"{endpoint:<24} {full_bytes:>10.0f} {after:>10.0f} {full_bytes / after:>7.0f}x")
+
+    await db.users.drop()
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Test harness: Socket.IO across worker processes
+Starts the stand-in broker (services.socket_cluster.start_broker) and WORKERS
+processes, each importing services.socket_service with SOCKET_MANAGER=broker.
+Clients speak engine.io long-polling straight to each worker's ASGI app, so
+no HTTP server or client library is needed. Checks that:
+  - presence of a user connected to one worker is visible on the others
+  - room emits (send_message) reach members connected to another worker
+  - notify_new_match called on one worker reaches both users elsewhere
+  - presence clears when the user disconnects
+Exits 1 if any check fails. No MongoDB needed.
+
+Usage (from backend/): python benchmarks/socket_cluster_harness.py [--workers 3]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from services.socket_cluster import start_broker  # noqa: E402
+
+PRESENCE_INTERVAL = 0.5  # seconds; short so the harness does not wait long
+TIMEOUT = 5.0
+
+
+class PollingClient:
+    """Minimal Socket.IO client over engine.io polling against an ASGI app"""
+
+    def __init__(self, app, auth: dict):
+        self.app = app
+        self.auth = auth
+        self.eio_sid = None
+        self.events = []
+        self._poller = None
+
+    async def _request(self, method: str, body: bytes = b"") -> bytes:
+        query = {"EIO": "4", "transport": "polling"}
+        if self.eio_sid:
+            query["sid"] = self.eio_sid
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": method, "scheme": "http", "path": "/socket.io/",
+            "raw_path": b"/socket.io/", "query_string": urlencode(query).encode(),
+            "root_path": "", "headers": [(b"host", b"harness"), (b"content-type", b"text/plain"),
+                                         (b"content-length", str(len(body)).encode())],
+            "client": ("127.0.0.1", 12345), "server": ("harness", 80),
+        }
+        chunks = []
+        sent = False
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                await asyncio.Event().wait()  # client never disconnects mid-request
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return b"".join(chunks)
+
+    async def connect(self):
+        handshake = (await self._request("GET")).decode()
+        self.eio_sid = json.loads(handshake[1:])["sid"]
+        await self._request("POST", ("40" + json.dumps(self.auth)).encode())
+        self._poller = asyncio.create_task(self._poll())
+
+    async def _poll(self):
+        while True:
+            payload = (await self._request("GET")).decode()
+            for packet in payload.split("\x1e"):
+                if packet == "2":
+                    await self._request("POST", b"3")
+                elif packet == "1":
+                    return
+                elif packet.startswith("42"):
+                    event, *args = json.loads(packet[2:])
+                    self.events.append((event, args[0] if args else None))
+
+    async def emit(self, event: str, data):
+        await self._request("POST", ("42" + json.dumps([event, data])).encode())
+
+    async def close(self):
+        await self._request("POST", b"41")
+        await self._request("POST", b"1")
+        if self._poller:
+            self._poller.cancel()
+
+
+def worker(broker_url: str, conn):
+    os.environ["SOCKET_MANAGER"] = "broker"
+    os.environ["SOCKET_BROKER_URL"] = broker_url
+    os.chdir(BACKEND_DIR)
+    asyncio.run(worker_main(conn))
+
+
+async def worker_main(conn):
+    import socketio
+    from services import socket_service
+
+    socket_service.sio.logger.setLevel("WARNING")
+    socket_service.client_manager.presence_interval = PRESENCE_INTERVAL
+    socket_service.presence.expiry = 3 * PRESENCE_INTERVAL
+    socket_service.start_client_manager()
+    app = socketio.ASGIApp(socket_service.sio)
+    clients = {}
+    loop = asyncio.get_running_loop()
+
+    while True:
+        command, *args = await loop.run_in_executor(None, conn.recv)
+        if command == "stop":
+            break
+        try:
+            if command == "connect":
+                user_id, = args
+                clients[user_id] = PollingClient(app, {"user_id": user_id})
+                await clients[user_id].connect()
+                result = True
+            elif command == "emit":
+                user_id, event, data = args
+                await clients[user_id].emit(event, data)
+                result = True
+            elif command == "events":
+                user_id, = args
+                result = clients[user_id].events
+            elif command == "online":
+                user_id, = args
+                result = socket_service.get_user_status(user_id)
+            elif command == "notify_match":
+                await socket_service.notify_new_match(*args)
+                result = True
+            elif command == "close":
+                user_id, = args
+                await clients.pop(user_id).close()
+                result = True
+            else:
+                result = f"unknown command {command}"
+        except Exception as e:
+            result = f"{type(e).__name__}: {e}"
+        conn.send(result)
+
+
+class Cluster:
+    def __init__(self, broker_url: str, size: int):
+        ctx = multiprocessing.get_context("spawn")
+        self.pipes = []
+        self.processes = []
+        for _ in range(size):
+            parent, child = ctx.Pipe()
+            process = ctx.Process(target=worker, args=(broker_url, child), daemon=True)
+            process.start()
+            self.pipes.append(parent)
+            self.processes.append(process)
+
+    async def call(self, index: int, *command):
+        loop = asyncio.get_running_loop()
+        pipe = self.pipes[index]
+        pipe.send(command)
+        return await loop.run_in_executor(None, pipe.recv)
+
+    async def wait_for(self, index: int, command: tuple, predicate) -> bool:
+        deadline = time.monotonic() + TIMEOUT
+        while time.monotonic() < deadline:
+            if predicate(await self.call(index, *command)):
+                return True
+            await asyncio.sleep(0.1)
+        return False
+
+    async def stop(self):
+        for index in range(len(self.pipes)):
+            self.pipes[index].send(("stop",))
+        for process in self.processes:
+            process.join(timeout=5)
+
+
+def has_event(name: str, **fields):
+    return lambda events: any(
+        event == name and all(data.get(k) == v for k, v in fields.items())
+        for event, data in events
+    )
+
+
+async def main(args):
+    broker = await start_broker()
+    host, port = broker.sockets[0].getsockname()[:2]
+    cluster = Cluster(f"tcp://{host}:{port}", args.workers)
+    last = args.workers - 1
+    results = []
+
+    async def check(name: str, ok: bool):
+        results.append(ok)
+        print(f"{'PASS' if ok else 'FAIL'}  {name}")
+
+    try:
+        await cluster.call(0, "connect", "alice")
+        await cluster.call(last, "connect", "bob")
+        for index in range(args.workers):
+            await check(f"worker {index} sees alice and bob online", await cluster.wait_for(
+                index, ("online", "alice"), bool
+            ) and await cluster.wait_for(index, ("online", "bob"), bool))
+
+        await cluster.call(0, "emit", "alice", "join_chat", {"user_id": "alice", "match_id": "m1"})
+        await cluster.call(last, "emit", "bob", "join_chat", {"user_id": "bob", "match_id": "m1"})
+        await cluster.call(0, "emit", "alice", "send_message",
+                           {"match_id": "m1", "sender_id": "alice", "message_id": "x1", "content": "hai"})
+        await check("room message reaches bob on another worker", await cluster.wait_for(
+            last, ("events", "bob"), has_event("new_message", message_id="x1")
+        ))
+        await check("sender gets delivery receipt", await cluster.wait_for(
+            0, ("events", "alice"), has_event("message_sent", message_id="x1")
+        ))
+
+        notifier = 1 if args.workers > 2 else 0
+        await cluster.call(notifier, "notify_match", "alice", "bob", "m2")
+        await check(f"notify_new_match from worker {notifier} reaches alice", await cluster.wait_for(
+            0, ("events", "alice"), has_event("new_match", match_id="m2")
+        ))
+        await check(f"notify_new_match from worker {notifier} reaches bob", await cluster.wait_for(
+            last, ("events", "bob"), has_event("new_match", match_id="m2")
+        ))
+
+        await cluster.call(0, "close", "alice")
+        await check("alice offline everywhere after disconnect", await cluster.wait_for(
+            last, ("online", "alice"), lambda online: online is False
+        ))
+    finally:
+        await cluster.stop()
+        broker.close()
+
+    print(f"{sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=3, help="Socket.IO worker processes")
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Management CLI untuk Miluv.app backend
+Usage: python manage.py <command>
+"""
+
+import argparse
+import asyncio
+import sys
+
+import server
+from services.indexes import apply_indexes, dedupe_unique_indexes, explain_query_shapes, index_report
+
+
+async def migrate_locations(args):
+    """Backfill GeoJSON location for users registered before geo indexing"""
+    await apply_indexes(server.db, ["users"])
+    modified = await server.migrate_user_locations()
+    print(f"Backfilled location on {modified} users")
+
+
+async def recompute_compat(args):
+    """Rebuild precomputed top-N compatibility lists"""
+    if args.user:
+        await server.compat_precomputer.update_user(args.user)
+        print(f"Recomputed compatibility list for user {args.user}")
+    else:
+        count = await server.compat_precomputer.recompute_all()
+        print(f"Recomputed compatibility lists for {count} users")
+
+
+async def encode_traits(args):
+    """Backfill integer trait codes used by the vectorized compatibility scorer"""
+    modified = await server.migrate_trait_codes()
+    print(f"Encoded traits of {modified} users")
+
+
+async def migrate_blobs(args):
+    """Move inline base64 photos and feed images into the blob store"""
+    migrated = await server.migrate_inline_images()
+    print(f"Migrated images of {migrated['users']} users and {migrated['feeds']} feeds")
+
+
+async def generate_variants(args):
+    """Render missing thumbnail/medium variants for stored profile and feed images"""
+    digests = set()
+    async for user in server.db.users.find({}, {"profile_photos": 1}):
+        digests.update(photo for photo in user.get("profile_photos", []) if server.is_digest(photo))
+    async for feed in server.db.feeds.find({}, {"images": 1}):
+        digests.update(image for image in feed.get("images", []) if server.is_digest(image))
+
+    try:
+        generated = 0
+        for digest in digests:
+            if await server.image_pipeline.generate(digest):
+                generated += 1
+    finally:
+        server.image_pipeline.shutdown()
+    print(f"Variants available for {generated} of {len(digests)} images")
+
+
+async def backfill_timelines(args):
+    """Backfill users.matched_user_ids and the materialized feed timelines"""
+    await apply_indexes(server.db, ["timelines"])
+    partners = await server.migrate_match_partners()
+    written = await server.feed_timeline.backfill()
+    print(f"Updated match partners on {partners} users, wrote {written} timeline entries")
+
+
+async def migrate_blocks(args):
+    """Move users.blocked_users arrays into the blocks collection"""
+    await apply_indexes(server.db, ["blocks"])
+    migrated = await server.migrate_block_lists()
+    print(f"Migrated {migrated} blocks")
+
+
+async def ensure_indexes(args):
+    """Remove duplicates blocking unique indexes, then create all indexes from the registry (idempotent)"""
+    dedupe = await dedupe_unique_indexes(server.db)
+    for name, removed in dedupe["removed"].items():
+        print(f"Removed {removed} duplicates blocking {name}")
+    for name, groups in dedupe["conflicts"].items():
+        for ids in groups:
+            print(f"DUPLICATE {name}: {', '.join(ids)}")
+
+    result = await apply_indexes(server.db)
+    print(f"Ensured {len(result['ensured'])} indexes")
+    for name, error in result["failed"].items():
+        print(f"FAILED {name}: {error}")
+    if result["failed"]:
+        sys.exit(1)
+
+
+async def check_indexes(args):
+    """Report missing/unregistered/unused indexes; with --explain, fail on any collection scan"""
+    problems = 0
+    for collection, report in (await index_report(server.db)).items():
+        for kind in ("missing", "unregistered", "unused"):
+            for name in report[kind]:
+                print(f"{kind:<13} {collection}.{name}")
+        problems += len(report["missing"])
+
+    if args.explain:
+        for result in await explain_query_shapes(server.db):
+            status = "ok  " if result["covered"] else "SCAN"
+            print(f"{status} {result['name']}: {', '.join(result['indexes']) or ', '.join(result['stages'])}")
+            problems += not result["covered"]
+
+    if problems:
+        sys.exit(1)
+
+
+COMMANDS = {
+    "migrate-locations": migrate_locations,
+    "recompute-compat": recompute_compat,
+    "encode-traits": encode_traits,
+    "migrate-blobs": migrate_blobs,
+    "generate-variants": generate_variants,
+    "backfill-timelines": backfill_timelines,
+    "migrate-blocks": migrate_blocks,
+    "ensure-indexes": ensure_indexes,
+    "check-indexes": check_indexes,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Miluv.app backend management")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("migrate-locations", help=migrate_locations.__doc__)
+    recompute = subparsers.add_parser("recompute-compat", help=recompute_compat.__doc__)
+    recompute.add_argument("--user", help="Only recompute this user id (and patch their neighbours)")
+    subparsers.add_parser("encode-traits", help=encode_traits.__doc__)
+    subparsers.add_parser("migrate-blobs", help=migrate_blobs.__doc__)
+    subparsers.add_parser("generate-variants", help=generate_variants.__doc__)
+    subparsers.add_parser("backfill-timelines", help=backfill_timelines.__doc__)
+    subparsers.add_parser("migrate-blocks", help=migrate_blocks.__doc__)
+    subparsers.add_parser("ensure-indexes", help=ensure_indexes.__doc__)
+    check = subparsers.add_parser("check-indexes", help=check_indexes.__doc__)
+    check.add_argument("--explain", action="store_true", help="Also explain() every registered query shape")
+
+    args = parser.parse_args()
+    try:
+        asyncio.run(COMMANDS[args.command](args))
+    finally:
+        server.client.close()
+
+
+if __name__ == "__main__":
+    main()
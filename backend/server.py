@@ -1,7 +1,10 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, File, UploadFile
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, File, UploadFile, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response, StreamingResponse
+import anyio
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
@@ -11,26 +14,113 @@ from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
-from jose import JWTError, jwt
 import math
+import heapq
+import asyncio
 import random
 import base64
+import binascii
+import hashlib
+import numpy as np
 from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from services.compatibility import batch_compatibility_scores, encode_traits
+from services.ttl_cache import TTLCache
+from services.compat_precompute import CompatibilityPrecomputer
+from services.geo_index import GeoIndex
+from services.user_repository import UserRepository
+from services.blob_store import create_blob_store, is_digest
+from services.image_variants import ImageVariantPipeline, VARIANT_SIZES
+from services.dataloader import DataLoader
+from services.request_scope import DBRoundTripListener, RequestScopeMiddleware, current_scope, round_trip_stats
+from services.feed_timeline import FeedTimeline
+from services.indexes import apply_indexes
+from services.seen_filter import SeenStore
+from services.block_index import BlockIndex
+from services.password_hasher import HasherOverloaded, PasswordHasher
+from services.auth_tokens import InvalidToken, TokenService
+from services.keyset import decode_keyset_cursor, newer_than, older_than, split_page
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# The listener attributes every MongoDB command to the request that issued it
+client = AsyncIOMotorClient(mongo_url, event_listeners=[DBRoundTripListener()])
 db = client[os.environ.get('DB_NAME', 'miluv_app')]
+users_repo = UserRepository(db)
+
+# Images live in a content-addressed blob store; documents keep SHA-256 digests
+blob_store = create_blob_store()
+# Resized variants (thumb, medium) rendered in a process pool after upload
+image_pipeline = ImageVariantPipeline(db, blob_store, max_workers=int(os.environ.get('IMAGE_WORKERS', 2)))
+
+# Per-user feed timelines, fanned out to the author and their matches on post
+feed_timeline = FeedTimeline(db)
+
+# Precomputed top-N compatibility lists, maintained in the background
+COMPAT_CELL_RADIUS_KM = int(os.environ.get('COMPAT_CELL_RADIUS_KM', 100))
+COMPAT_TOP_N = int(os.environ.get('COMPAT_TOP_N', 200))
+PRECOMPUTED_DISCOVER = os.environ.get('PRECOMPUTED_DISCOVER', 'false').lower() == 'true'
+compat_precomputer = CompatibilityPrecomputer(db, cell_radius_km=COMPAT_CELL_RADIUS_KM, top_n=COMPAT_TOP_N)
+
+# Optional in-process geohash index of user locations (per worker process).
+# Each worker polls users.location_updated_at so moves handled by other
+# workers show up within GEO_INDEX_SYNC_INTERVAL seconds.
+GEO_INDEX_ENABLED = os.environ.get('GEO_INDEX_ENABLED', 'false').lower() == 'true'
+GEO_INDEX_SYNC_INTERVAL = float(os.environ.get('GEO_INDEX_SYNC_INTERVAL', 15))  # seconds
+GEO_INDEX_SYNC_OVERLAP = timedelta(seconds=5)  # tolerated clock skew between app servers
+geo_index = GeoIndex(precision=int(os.environ.get('GEO_INDEX_PRECISION', 5)))
+geo_index_sync_task: Optional[asyncio.Task] = None
 
 # Security
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt runs off the event loop in a bounded pool; excess logins get a 503
+password_hasher = PasswordHasher(
+    pwd_context,
+    max_workers=int(os.environ.get('BCRYPT_WORKERS', os.cpu_count() or 1)),
+    max_queue=int(os.environ.get('BCRYPT_MAX_QUEUE', 64))
+)
+# Fixed bcrypt cost, or calibrate at startup to the highest cost within BCRYPT_TARGET_MS
+BCRYPT_ROUNDS = os.environ.get('BCRYPT_ROUNDS')
+BCRYPT_TARGET_MS = float(os.environ.get('BCRYPT_TARGET_MS', 250))
+if BCRYPT_ROUNDS:
+    password_hasher.set_rounds(int(BCRYPT_ROUNDS))
 security = HTTPBearer()
 SECRET_KEY = os.environ.get('SECRET_KEY', 'miluv-secret-key-change-in-production-123456789')
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_DAYS = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get('ACCESS_TOKEN_EXPIRE_MINUTES', 15))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get('REFRESH_TOKEN_EXPIRE_DAYS', 30))
+token_service = TokenService(
+    db,
+    SECRET_KEY,
+    algorithm=ALGORITHM,
+    access_ttl=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+    refresh_ttl=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    cache_size=int(os.environ.get('TOKEN_CACHE_MAX', 10000))
+)
+
+# Short-lived cache of authenticated user records (photo blobs excluded)
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', 30))  # seconds
+USER_CACHE_MAX = int(os.environ.get('USER_CACHE_MAX', 10000))
+user_cache = TTLCache(maxsize=USER_CACHE_MAX, ttl=USER_CACHE_TTL)
+
+# Who each user is blocked with (either direction), for O(1) pair checks
+block_index = BlockIndex(
+    db,
+    cache_size=int(os.environ.get('BLOCK_CACHE_MAX', 50000)),
+    cache_ttl=float(os.environ.get('BLOCK_CACHE_TTL', 60))
+)
+
+# Per-user Bloom filters of everyone already liked or passed, hidden from discover
+seen_store = SeenStore(
+    db,
+    cache_size=int(os.environ.get('SEEN_CACHE_MAX', 10000)),
+    cache_ttl=float(os.environ.get('SEEN_CACHE_TTL', 60))
+)
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -64,6 +154,9 @@ class UserLogin(BaseModel):
     email: EmailStr
     password: str
 
+class RefreshToken(BaseModel):
+    refresh_token: str
+
 class FaceVerification(BaseModel):
     selfie_photo: str  # base64
 
@@ -74,6 +167,13 @@ class AssessmentAnswer(BaseModel):
 class LikeUser(BaseModel):
     target_user_id: str
 
+class Swipe(BaseModel):
+    target_user_id: str
+    action: str  # like, pass
+
+class SwipeBatch(BaseModel):
+    swipes: List[Swipe]
+
 class SendMessage(BaseModel):
     match_id: str
     content: str
@@ -88,6 +188,10 @@ class ReportItem(BaseModel):
     target_id: str
     reason: str
 
+class UpdateLocation(BaseModel):
+    latitude: float
+    longitude: float
+
 class BookConsultation(BaseModel):
     counselor_id: str
     schedule: str
@@ -97,49 +201,223 @@ class BookConsultation(BaseModel):
 # UTILS
 # ============================================
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except HasherOverloaded:
+        raise HTTPException(status_code=503, detail="Server busy, try again", headers={"Retry-After": "1"})
+
+async def verify_password(plain_password: str, hashed_password: str):
+    """(valid, new hash or None); a new hash means the stored one is outdated"""
+    try:
+        return await password_hasher.verify_and_update(plain_password, hashed_password)
+    except HasherOverloaded:
+        raise HTTPException(status_code=503, detail="Server busy, try again", headers={"Retry-After": "1"})
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+def issue_access_token(user_id: str, user: dict) -> str:
+    """Access token carrying the profile claims of `user`"""
+    # Photo digests ride along so /profile needs no lookup; legacy base64 photos don't fit
+    photos = user.get("profile_photos")
+    if photos is None or not all(is_digest(photo) for photo in photos):
+        photos = None
+    return token_service.issue_access(user_id, user, photos)
 
-def create_access_token(data: dict) -> str:
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=ACCESS_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+async def reissue_access_token(user_id: str) -> str:
+    """Access token with the user's current claims, returned by endpoints that
+    change them; other workers would keep trusting the old token's claims"""
+    user = await users_repo.get(user_id, "token_claims")
+    return issue_access_token(user_id, user)
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def issue_tokens(user_id: str, user: dict) -> dict:
+    """Short-lived access token (with profile claims) plus a refresh token"""
+    return {
+        "token": issue_access_token(user_id, user),
+        "refresh_token": await token_service.issue_refresh(user_id),
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
+    }
+
+def verify_token(credentials: HTTPAuthorizationCredentials) -> dict:
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid authentication")
-        
-        user = await db.users.find_one({"_id": ObjectId(user_id)})
+        return token_service.verify_access(credentials.credentials)
+    except InvalidToken:
+        raise HTTPException(status_code=401, detail="Invalid authentication")
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    payload = verify_token(credentials)
+    user_id: str = payload["sub"]
+    
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await users_repo.get(user_id, "current_user")
         if user is None:
             raise HTTPException(status_code=401, detail="User not found")
         
         user["id"] = str(user["_id"])
-        return user
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid authentication")
+        user_cache.set(user_id, user)
+    
+    # Copy so request handlers can't mutate the cached record
+    return dict(user)
+
+async def get_token_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Current user from the access token's claims alone (no database hit);
+    falls back to get_current_user when the claims may be outdated"""
+    payload = verify_token(credentials)
+    if not token_service.claims_fresh(payload):
+        return await get_current_user(credentials)
+    return {**payload["claims"], "id": payload["sub"]}
+
+async def get_admin_user(current_user: dict = Depends(get_current_user)):
+    """Current user, who must have role "admin" """
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+def invalidate_user_cache(user_id: str):
+    """Drop a cached user record after writing to their document"""
+    user_cache.pop(user_id)
+    token_service.mark_stale(user_id)
+
+# Request-scoped loaders: lookups in the same tick become one $in query
+
+def user_loader(view: str) -> DataLoader:
+    """Users by id string, projected with `view`"""
+    async def batch(user_ids):
+        valid_ids = [ObjectId(user_id) for user_id in user_ids if ObjectId.is_valid(user_id)]
+        users = await users_repo.get_many(valid_ids, view)
+        return {str(user_id): user for user_id, user in users.items()}
+    return current_scope().loader(f"users:{view}", lambda: DataLoader(batch))
+
+def match_loader() -> DataLoader:
+    """Matches by id string"""
+    async def batch(match_ids):
+        valid_ids = [ObjectId(match_id) for match_id in match_ids if ObjectId.is_valid(match_id)]
+        matches = await db.matches.find({"_id": {"$in": valid_ids}}).to_list(None)
+        return {str(match["_id"]): match for match in matches}
+    return current_scope().loader("matches", lambda: DataLoader(batch))
+
+def geo_point(latitude: float, longitude: float) -> dict:
+    """Build a GeoJSON point (MongoDB expects [longitude, latitude])"""
+    return {"type": "Point", "coordinates": [longitude, latitude]}
 
-def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Calculate distance between two coordinates in km using Haversine formula"""
-    R = 6371  # Earth radius in km
+async def migrate_user_locations() -> int:
+    """Backfill GeoJSON `location` from legacy latitude/longitude fields"""
+    result = await db.users.update_many(
+        {
+            "location": {"$exists": False},
+            "latitude": {"$type": "number"},
+            "longitude": {"$type": "number"}
+        },
+        [{"$set": {"location": {"type": "Point", "coordinates": ["$longitude", "$latitude"]}}}]
+    )
+    return result.modified_count
+
+async def migrate_match_partners() -> int:
+    """Backfill users.matched_user_ids from the matches collection"""
+    partners = {}
+    async for match in db.matches.find({}, {"user_a_id": 1, "user_b_id": 1}):
+        partners.setdefault(match["user_a_id"], set()).add(match["user_b_id"])
+        partners.setdefault(match["user_b_id"], set()).add(match["user_a_id"])
     
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lon = math.radians(lon2 - lon1)
+    modified = 0
+    for user_id, matched_ids in partners.items():
+        if not ObjectId.is_valid(user_id):
+            continue
+        result = await db.users.update_one(
+            {"_id": ObjectId(user_id)},
+            {"$set": {"matched_user_ids": sorted(matched_ids)}}
+        )
+        modified += result.modified_count
+        invalidate_user_cache(user_id)
+    return modified
+
+async def migrate_trait_codes() -> int:
+    """Backfill users.trait_codes for users who took assessments before it existed"""
+    modified = 0
+    async for user in users_repo.find({"trait_codes": {"$exists": False}}, "assessment_progress"):
+        result = await db.users.update_one(
+            {"_id": user["_id"]},
+            {"$set": {"trait_codes": encode_traits(user)}}
+        )
+        modified += result.modified_count
+        invalidate_user_cache(str(user["_id"]))
+    return modified
+
+async def migrate_block_lists() -> int:
+    """Move legacy users.blocked_users arrays into the blocks collection"""
+    migrated = 0
+    async for user in db.users.find({"blocked_users": {"$exists": True}}, {"blocked_users": 1}):
+        migrated += await block_index.import_blocks(str(user["_id"]), user.get("blocked_users", []))
+        await db.users.update_one({"_id": user["_id"]}, {"$unset": {"blocked_users": ""}})
+        invalidate_user_cache(str(user["_id"]))
+    # Nothing writes blocked_users any more, so one complete pass is final
+    await db.migrations.update_one(
+        {"_id": "block_lists"}, {"$set": {"completed_at": datetime.utcnow(), "migrated": migrated}}, upsert=True
+    )
+    return migrated
+
+async def record_match_partners(user_a_id: str, user_b_id: str):
+    """Keep matched_user_ids on both users in step with a new match"""
+    await db.users.bulk_write([
+        UpdateOne({"_id": ObjectId(user_a_id)}, {"$addToSet": {"matched_user_ids": user_b_id}}),
+        UpdateOne({"_id": ObjectId(user_b_id)}, {"$addToSet": {"matched_user_ids": user_a_id}})
+    ], ordered=False)
+    invalidate_user_cache(user_a_id)
+    invalidate_user_cache(user_b_id)
+    await feed_timeline.on_match(user_a_id, user_b_id)
+
+async def store_image(image_base64: str, variants: bool = True) -> str:
+    """Decode a base64 upload into the blob store and return its digest"""
+    if "," in image_base64[:100] and image_base64.startswith("data:"):
+        image_base64 = image_base64.split(",", 1)[1]  # strip data URI prefix
+    try:
+        data = base64.b64decode(image_base64, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid base64 image")
+    if not data:
+        raise HTTPException(status_code=400, detail="Empty image")
+    digest = await run_in_threadpool(blob_store.put, data)
+    if variants:
+        image_pipeline.schedule(digest)
+    return digest
+
+def image_url(photo: Optional[str], variant: Optional[str] = None) -> Optional[str]:
+    """Public URL for a stored image (or one of its resized variants);
+    legacy inline base64 is passed through"""
+    if photo and is_digest(photo):
+        return f"/api/images/{photo}/{variant}" if variant else f"/api/images/{photo}"
+    return photo
+
+async def migrate_inline_images() -> dict:
+    """Move legacy base64 photos/feed images out of documents into the blob store"""
+    users_migrated = 0
+    users_cursor = db.users.find(
+        {"$or": [
+            {"profile_photos": {"$elemMatch": {"$not": {"$regex": "^[0-9a-f]{64}$"}}}},
+            {"selfie_photo": {"$type": "string", "$not": {"$regex": "^[0-9a-f]{64}$"}}}
+        ]},
+        {"profile_photos": 1, "selfie_photo": 1}
+    )
+    async for user in users_cursor:
+        update = {"profile_photos": [
+            photo if is_digest(photo) else await store_image(photo, variants=False)
+            for photo in user.get("profile_photos", [])
+        ]}
+        if user.get("selfie_photo") and not is_digest(user["selfie_photo"]):
+            update["selfie_photo"] = await store_image(user["selfie_photo"], variants=False)
+        await db.users.update_one({"_id": user["_id"]}, {"$set": update})
+        users_migrated += 1
     
-    a = math.sin(delta_lat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    feeds_migrated = 0
+    feeds_cursor = db.feeds.find(
+        {"images": {"$elemMatch": {"$not": {"$regex": "^[0-9a-f]{64}$"}}}},
+        {"images": 1}
+    )
+    async for feed in feeds_cursor:
+        images = [image if is_digest(image) else await store_image(image, variants=False) for image in feed["images"]]
+        await db.feeds.update_one({"_id": feed["_id"]}, {"$set": {"images": images}})
+        feeds_migrated += 1
     
-    return R * c
+    return {"users": users_migrated, "feeds": feeds_migrated}
 
 def mock_face_verification(profile_photo: str, selfie_photo: str) -> bool:
     """Mock AWS Rekognition - always returns True for demo"""
@@ -147,49 +425,6 @@ def mock_face_verification(profile_photo: str, selfie_photo: str) -> bool:
     # For now, just return True
     return True
 
-def calculate_compatibility_score(user1: dict, user2: dict) -> float:
-    """Calculate compatibility based on assessment results"""
-    score = 0.0
-    
-    # MBTI - 25%
-    if user1.get('mbti') == user2.get('mbti'):
-        score += 0.25
-    elif user1.get('mbti') and user2.get('mbti'):
-        # Similar type adds partial score
-        if user1['mbti'][0] == user2['mbti'][0]:  # Same I/E
-            score += 0.10
-        if user1['mbti'][1] == user2['mbti'][1]:  # Same N/S
-            score += 0.05
-        if user1['mbti'][2] == user2['mbti'][2]:  # Same T/F
-            score += 0.05
-        if user1['mbti'][3] == user2['mbti'][3]:  # Same J/P
-            score += 0.05
-    
-    # Love Language - 20%
-    if user1.get('love_language') == user2.get('love_language'):
-        score += 0.20
-    elif user1.get('love_language') and user2.get('love_language'):
-        score += 0.05  # Different but both have preference
-    
-    # Readiness - 30% (higher readiness = better match)
-    if user1.get('readiness') and user2.get('readiness'):
-        avg_readiness = (user1['readiness'] + user2['readiness']) / 2
-        score += (avg_readiness / 100) * 0.30
-    
-    # Temperament - 15%
-    if user1.get('temperament') == user2.get('temperament'):
-        score += 0.15
-    elif user1.get('temperament') and user2.get('temperament'):
-        score += 0.05
-    
-    # DISC - 10%
-    if user1.get('disc') == user2.get('disc'):
-        score += 0.10
-    elif user1.get('disc') and user2.get('disc'):
-        score += 0.03
-    
-    return min(score * 100, 100)  # Convert to percentage
-
 # ============================================
 # ASSESSMENT QUESTIONS DATABASE
 # ============================================
@@ -345,6 +580,19 @@ def calculate_assessment_result(test_type: str, answers: List[int]) -> dict:
 async def root():
     return {"message": "Miluv.app API", "version": "1.0"}
 
+@api_router.get("/metrics")
+async def get_metrics(admin: dict = Depends(get_admin_user)):
+    """Internal service metrics (admins only)"""
+    return {
+        "compat_precompute": await compat_precomputer.stats(),
+        "user_cache": user_cache.stats(),
+        "seen_filters": seen_store.stats(),
+        "block_index": block_index.stats(),
+        "verified_tokens": token_service.stats(),
+        "password_hasher": password_hasher.stats(),
+        "db_round_trips": round_trip_stats.snapshot()
+    }
+
 # AUTH ENDPOINTS
 
 @api_router.post("/auth/register")
@@ -352,17 +600,17 @@ async def register(user_data: UserRegister):
     """Register new user"""
     try:
         # Check if email already exists
-        existing_user = await db.users.find_one({"email": user_data.email})
+        existing_user = await users_repo.find_one({"email": user_data.email}, "exists")
         if existing_user:
             raise HTTPException(status_code=400, detail="Email already registered")
         
         # Check if username already exists
-        existing_username = await db.users.find_one({"username": user_data.username})
+        existing_username = await users_repo.find_one({"username": user_data.username}, "exists")
         if existing_username:
             raise HTTPException(status_code=400, detail="Username already taken")
         
         # Create user
-        hashed_pw = hash_password(user_data.password)
+        hashed_pw = await hash_password(user_data.password)
         user_doc = {
             "name": user_data.name,
             "email": user_data.email,
@@ -370,36 +618,40 @@ async def register(user_data: UserRegister):
             "date_of_birth": user_data.date_of_birth,
             "gender": user_data.gender,
             "username": user_data.username,
-            "profile_photos": [user_data.profile_photo],
+            "profile_photos": [await store_image(user_data.profile_photo)],
             "verified_face": False,
             "selfie_photo": None,
             "latitude": user_data.latitude,
             "longitude": user_data.longitude,
+            "location": geo_point(user_data.latitude, user_data.longitude),
+            "location_updated_at": datetime.utcnow(),
             "mbti": None,
             "love_language": None,
             "readiness": 0,
             "temperament": None,
             "disc": None,
+            "trait_codes": encode_traits({}),
             "assessments_completed": False,
             "role": "user",
             "created_at": datetime.utcnow(),
-            "blocked_users": [],
             "bio": ""
         }
         
         result = await db.users.insert_one(user_doc)
         user_id = str(result.inserted_id)
-        
-        # Create token
-        token = create_access_token({"sub": user_id})
+        compat_precomputer.schedule(user_id)
+        if GEO_INDEX_ENABLED:
+            geo_index.upsert(user_id, user_data.latitude, user_data.longitude)
         
         return {
             "message": "Registration successful",
-            "token": token,
+            **await issue_tokens(user_id, user_doc),
             "user_id": user_id,
             "needs_face_verification": True,
             "needs_assessment": True
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Registration error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -408,19 +660,21 @@ async def register(user_data: UserRegister):
 async def login(credentials: UserLogin):
     """Login user"""
     try:
-        user = await db.users.find_one({"email": credentials.email})
+        user = await users_repo.find_one({"email": credentials.email}, "credentials")
         if not user:
             raise HTTPException(status_code=401, detail="Invalid credentials")
         
-        if not verify_password(credentials.password, user["password_hash"]):
+        valid, new_hash = await verify_password(credentials.password, user["password_hash"])
+        if not valid:
             raise HTTPException(status_code=401, detail="Invalid credentials")
         
         user_id = str(user["_id"])
-        token = create_access_token({"sub": user_id})
-        
+        if new_hash:
+            # Transparent upgrade to the current bcrypt cost
+            await db.users.update_one({"_id": user["_id"]}, {"$set": {"password_hash": new_hash}})
         return {
             "message": "Login successful",
-            "token": token,
+            **await issue_tokens(user_id, user),
             "user_id": user_id,
             "verified_face": user.get("verified_face", False),
             "assessments_completed": user.get("assessments_completed", False),
@@ -432,14 +686,34 @@ async def login(credentials: UserLogin):
         logger.error(f"Login error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.post("/auth/refresh")
+async def refresh_token(refresh: RefreshToken):
+    """Trade a refresh token for a new access token (refresh tokens are single use)"""
+    try:
+        user_id = await token_service.rotate_refresh(refresh.refresh_token)
+    except InvalidToken:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    
+    user = await users_repo.get(user_id, "token_claims")
+    if user is None:
+        raise HTTPException(status_code=401, detail="User not found")
+    return await issue_tokens(user_id, user)
+
+@api_router.post("/auth/logout")
+async def logout(refresh: RefreshToken):
+    """Revoke a refresh token"""
+    await token_service.revoke_refresh(refresh.refresh_token)
+    return {"message": "Logged out"}
+
 @api_router.post("/auth/verify-face")
 async def verify_face(verification: FaceVerification, current_user: dict = Depends(get_current_user)):
     """Verify user face with selfie (mocked AWS Rekognition)"""
     try:
-        profile_photo = current_user["profile_photos"][0]
-        selfie_photo = verification.selfie_photo
+        photos = await users_repo.get(current_user["id"], "face_source")
+        profile_photo = photos["profile_photos"][0]
+        selfie_photo = await store_image(verification.selfie_photo, variants=False)
         
-        # Mock verification - in production, call AWS Rekognition
+        # Mock verification - in production, load both blobs and call AWS Rekognition
         is_match = mock_face_verification(profile_photo, selfie_photo)
         
         if is_match:
@@ -447,9 +721,16 @@ async def verify_face(verification: FaceVerification, current_user: dict = Depen
                 {"_id": ObjectId(current_user["id"])},
                 {"$set": {"verified_face": True, "selfie_photo": selfie_photo}}
             )
-            return {"message": "Face verified successfully", "verified": True}
+            invalidate_user_cache(current_user["id"])
+            return {
+                "message": "Face verified successfully",
+                "verified": True,
+                "token": await reissue_access_token(current_user["id"])
+            }
         else:
             return {"message": "Face verification failed", "verified": False}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Face verification error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -512,7 +793,7 @@ async def submit_assessment(answer_data: AssessmentAnswer, current_user: dict =
         )
         
         # Check if all assessments completed
-        user = await db.users.find_one({"_id": ObjectId(current_user["id"])})
+        user = await users_repo.get(current_user["id"], "assessment_progress")
         all_completed = all([
             user.get("mbti"),
             user.get("love_language"),
@@ -521,23 +802,32 @@ async def submit_assessment(answer_data: AssessmentAnswer, current_user: dict =
             user.get("disc")
         ])
         
+        # Integer codes read by the vectorized scorer
+        derived = {"trait_codes": encode_traits(user)}
         if all_completed:
-            await db.users.update_one(
-                {"_id": ObjectId(current_user["id"])},
-                {"$set": {"assessments_completed": True}}
-            )
+            derived["assessments_completed"] = True
+        await db.users.update_one(
+            {"_id": ObjectId(current_user["id"])},
+            {"$set": derived}
+        )
+        
+        invalidate_user_cache(current_user["id"])
+        
+        # Traits changed: refresh precomputed compatibility lists
+        compat_precomputer.schedule(current_user["id"])
         
         return {
             "message": "Assessment submitted successfully",
             "result": result,
-            "all_completed": all_completed
+            "all_completed": all_completed,
+            "token": await reissue_access_token(current_user["id"])
         }
     except Exception as e:
         logger.error(f"Assessment submission error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/assessment/status")
-async def get_assessment_status(current_user: dict = Depends(get_current_user)):
+async def get_assessment_status(current_user: dict = Depends(get_token_user)):
     """Get user assessment completion status"""
     return {
         "mbti": current_user.get("mbti") is not None,
@@ -550,79 +840,265 @@ async def get_assessment_status(current_user: dict = Depends(get_current_user)):
 
 # DISCOVER & MATCHING ENDPOINTS
 
+def build_discover_card(user: dict, distance: float, compatibility: float) -> dict:
+    """Response payload for one discover candidate"""
+    return {
+        "id": str(user["_id"]),
+        "name": user["name"],
+        "age": calculate_age(user["date_of_birth"]),
+        "gender": user["gender"],
+        "profile_photos": [image_url(photo, "medium") for photo in user["profile_photos"]],
+        "bio": user.get("bio", ""),
+        "distance": round(distance, 1),
+        "compatibility": round(compatibility, 1),
+        "mbti": user.get("mbti"),
+        "love_language": user.get("love_language"),
+        "temperament": user.get("temperament"),
+        "disc": user.get("disc"),
+        "verified_face": user.get("verified_face", False),
+        "already_liked": False  # liked and passed users are excluded from discover
+    }
+
+async def load_precomputed_candidates(current_user: dict, radius: int, needed: int, seen, blocked):
+    """(users, scores, complete) from the precomputed top-N list, or None if no
+    usable list exists. `complete` is False when the cell held more than N
+    candidates; such a list is only used if it still has `needed` rows."""
+    if not PRECOMPUTED_DISCOVER or radius > COMPAT_CELL_RADIUS_KM:
+        return None
+    
+    topn = await db.compat_topn.find_one({"_id": ObjectId(current_user["id"])})
+    if topn is None:
+        return None
+    
+    users, scores = [], []
+    swiped = 0
+    for entry in topn["candidates"]:
+        candidate_id = str(entry["user_id"])
+        if candidate_id in seen or candidate_id in blocked:
+            swiped += 1
+        elif entry["distance"] <= radius * 1000:
+            users.append({"_id": entry["user_id"], "distance": entry["distance"]})
+            scores.append(entry["compatibility"])
+    
+    # A full list may have dropped candidates beyond the top N
+    complete = not topn.get("truncated") and len(topn["candidates"]) < COMPAT_TOP_N
+    if not users or (not complete and len(users) < needed):
+        # Swipes only ever shrink the list; a recompute refills it from the cell
+        if swiped:
+            compat_precomputer.schedule(current_user["id"])
+        return None
+    return users, scores, complete
+
+def discover_geo_near(current_user: dict, radius: int) -> dict:
+    """$geoNear stage for eligible users inside the radius (2dsphere index on `location`)"""
+    near = current_user.get("location") or geo_point(current_user["latitude"], current_user["longitude"])
+    return {"$geoNear": {
+        "near": near,
+        "key": "location",
+        "distanceField": "distance",
+        "maxDistance": radius * 1000,  # meters
+        "spherical": True,
+        "query": {
+            "_id": {"$ne": ObjectId(current_user["id"])},
+            "assessments_completed": True
+        }
+    }}
+
+async def count_discover_candidates(current_user: dict, radius: int, seen, blocked) -> int:
+    """Live number of candidates, for when the precomputed list is only the top N"""
+    users_cursor = db.users.aggregate([discover_geo_near(current_user, radius), {"$project": {"_id": 1}}])
+    return sum([
+        1 async for user in users_cursor
+        if str(user["_id"]) not in blocked and str(user["_id"]) not in seen
+    ])
+
+async def load_discover_candidates(current_user: dict, radius: int, needed: int = 1):
+    """Nearby, unblocked, not yet swiped candidates (ranking fields only), their
+    compatibility scores and the total number of candidates"""
+    seen, blocked = await asyncio.gather(
+        seen_store.get(current_user["id"]),
+        block_index.blocked_with(current_user["id"])
+    )
+    precomputed = await load_precomputed_candidates(current_user, radius, needed, seen, blocked)
+    if precomputed is not None:
+        users, scores, complete = precomputed
+        total = len(users) if complete else await count_discover_candidates(current_user, radius, seen, blocked)
+        return users, scores, total
+    
+    if GEO_INDEX_ENABLED:
+        # Nearby ids from the in-process index, then one $in for ranking fields
+        nearby = geo_index.within(current_user["latitude"], current_user["longitude"], radius, exclude=current_user["id"])
+        nearby.sort(key=lambda item: item[1])
+        distances = {ObjectId(user_id): distance * 1000 for user_id, distance in nearby}  # meters
+        users_cursor = users_repo.find(
+            {"_id": {"$in": list(distances)}, "assessments_completed": True},
+            "ranking"
+        )
+        found = {user["_id"]: user for user in await users_cursor.to_list(None)}
+        users = []
+        for user_id, distance in distances.items():
+            if user_id in found:
+                found[user_id]["distance"] = distance
+                users.append(found[user_id])
+    else:
+        # Only users inside the radius leave the database
+        users_cursor = db.users.aggregate([
+            discover_geo_near(current_user, radius),
+            {"$project": {**users_repo.projection("ranking"), "distance": 1}}
+        ])
+        users = await users_cursor.to_list(None)
+    
+    users, scores = rank_nearby_users(current_user, users, seen, blocked)
+    return users, scores, len(users)
+
+def rank_nearby_users(current_user: dict, users: list, seen, blocked):
+    """Drop blocked pairs and already swiped users, score the rest against current user"""
+    # Filter blocked and seen users, O(1) per candidate
+    users = [
+        user for user in users
+        if str(user["_id"]) not in blocked and str(user["_id"]) not in seen
+    ]
+    
+    # Score the whole block in one vectorized pass
+    scores = batch_compatibility_scores(current_user, users)
+    return users, scores
+
+async def build_discover_page(entries: list) -> list:
+    """Cards for ranked (user_id, distance_km, compatibility) entries, one $in query for profiles"""
+    profiles = await users_repo.get_many([entry[0] for entry in entries], "discover_card")
+    return [
+        build_discover_card(profiles[user_id], distance, compatibility)
+        for user_id, distance, compatibility in entries if user_id in profiles
+    ]
+
+# Ranked candidate snapshots for cursor pagination, one per user.
+# Stored as packed arrays (28 bytes per candidate), so the defaults cap
+# snapshots at about 30 MB per worker.
+DISCOVER_SNAPSHOT_TTL = int(os.environ.get('DISCOVER_SNAPSHOT_TTL', 900))  # seconds
+DISCOVER_SNAPSHOT_MAX_USERS = int(os.environ.get('DISCOVER_SNAPSHOT_MAX_USERS', 500))
+DISCOVER_SNAPSHOT_MAX_CANDIDATES = int(os.environ.get('DISCOVER_SNAPSHOT_MAX_CANDIDATES', 2000))
+# Snapshots live in db.discover_snapshots (TTL index) so a cursor works on any
+# worker; this cache only saves the read when the same worker serves the next page
+discover_snapshots = TTLCache(maxsize=DISCOVER_SNAPSHOT_MAX_USERS, ttl=DISCOVER_SNAPSHOT_TTL)
+
+def make_discover_snapshot(users: list, scores: list, order: list) -> dict:
+    """Ranked rows as concatenated 12-byte ids plus distance (km) and score arrays"""
+    return {
+        "id": uuid.uuid4().hex,
+        "size": len(order),
+        "ids": b"".join(users[i]["_id"].binary for i in order),
+        "distances": np.fromiter((users[i]["distance"] / 1000 for i in order), dtype=np.float64, count=len(order)),
+        "scores": np.fromiter((scores[i] for i in order), dtype=np.float64, count=len(order)),
+    }
+
+def snapshot_entries(snapshot: dict, start: int, end: int) -> list:
+    """(user_id, distance_km, compatibility) rows of a snapshot slice"""
+    end = min(end, snapshot["size"])
+    ids = snapshot["ids"]
+    return list(zip(
+        (ObjectId(ids[i * 12:(i + 1) * 12]) for i in range(start, end)),
+        snapshot["distances"][start:end].tolist(),
+        snapshot["scores"][start:end].tolist()
+    ))
+
+async def save_discover_snapshot(user_id: str, snapshot: dict):
+    """Replace the user's snapshot, shared by every worker until it expires"""
+    discover_snapshots.set(user_id, snapshot)
+    await db.discover_snapshots.replace_one({"_id": user_id}, {
+        "snapshot_id": snapshot["id"],
+        "size": snapshot["size"],
+        "ids": snapshot["ids"],
+        "distances": snapshot["distances"].tobytes(),
+        "scores": snapshot["scores"].tobytes(),
+        "expires_at": datetime.utcnow() + timedelta(seconds=DISCOVER_SNAPSHOT_TTL)
+    }, upsert=True)
+
+async def load_discover_snapshot(user_id: str, snapshot_id: str) -> Optional[dict]:
+    """The user's snapshot if it is still `snapshot_id` and not expired"""
+    snapshot = discover_snapshots.get(user_id)
+    if snapshot is not None and snapshot["id"] == snapshot_id:
+        return snapshot
+    # TTL deletes lag by up to a minute, so expiry is checked here too
+    doc = await db.discover_snapshots.find_one(
+        {"_id": user_id, "snapshot_id": snapshot_id, "expires_at": {"$gt": datetime.utcnow()}}
+    )
+    if doc is None:
+        return None
+    snapshot = {
+        "id": doc["snapshot_id"],
+        "size": doc["size"],
+        "ids": doc["ids"],
+        "distances": np.frombuffer(doc["distances"], dtype=np.float64),
+        "scores": np.frombuffer(doc["scores"], dtype=np.float64),
+    }
+    discover_snapshots.set(user_id, snapshot)
+    return snapshot
+
+def encode_discover_cursor(snapshot_id: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{snapshot_id}:{offset}".encode()).decode()
+
+def decode_discover_cursor(cursor: str):
+    try:
+        snapshot_id, offset = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        if int(offset) < 0:
+            raise ValueError(offset)
+        return snapshot_id, int(offset)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @api_router.get("/discover")
-async def discover_users(radius: int = 50, page: int = 1, limit: int = 20, current_user: dict = Depends(get_current_user)):
+async def discover_users(
+    radius: int = 50,
+    page: int = 1,
+    limit: int = 20,
+    paginate: str = "page",  # page, cursor
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
     """Get discover list with matching algorithm"""
     try:
         # Check if assessments completed
         if not current_user.get("assessments_completed"):
             raise HTTPException(status_code=403, detail="Complete assessments first")
         
-        # Get all users except current user
-        users_cursor = db.users.find({
-            "_id": {"$ne": ObjectId(current_user["id"])},
-            "assessments_completed": True
-        })
-        
-        users = await users_cursor.to_list(None)
-        
-        # Filter by radius and calculate compatibility
-        candidates = []
-        for user in users:
-            # Skip blocked users
-            if current_user["id"] in user.get("blocked_users", []):
-                continue
-            if str(user["_id"]) in current_user.get("blocked_users", []):
-                continue
-            
-            # Calculate distance
-            distance = calculate_distance(
-                current_user["latitude"], 
-                current_user["longitude"],
-                user["latitude"], 
-                user["longitude"]
-            )
-            
-            if distance <= radius:
-                # Calculate compatibility
-                compatibility = calculate_compatibility_score(current_user, user)
-                
-                # Check if already liked or matched
-                like_exists = await db.likes.find_one({
-                    "from_user_id": current_user["id"],
-                    "to_user_id": str(user["_id"])
-                })
-                
-                candidates.append({
-                    "id": str(user["_id"]),
-                    "name": user["name"],
-                    "age": calculate_age(user["date_of_birth"]),
-                    "gender": user["gender"],
-                    "profile_photos": user["profile_photos"],
-                    "bio": user.get("bio", ""),
-                    "distance": round(distance, 1),
-                    "compatibility": round(compatibility, 1),
-                    "mbti": user.get("mbti"),
-                    "love_language": user.get("love_language"),
-                    "temperament": user.get("temperament"),
-                    "disc": user.get("disc"),
-                    "verified_face": user.get("verified_face", False),
-                    "already_liked": like_exists is not None
-                })
-        
-        # Sort by compatibility
-        candidates.sort(key=lambda x: x["compatibility"], reverse=True)
-        
-        # Pagination
+        # Cursor pages are served from the ranked snapshot in O(limit)
+        if cursor:
+            snapshot_id, offset = decode_discover_cursor(cursor)
+            snapshot = await load_discover_snapshot(current_user["id"], snapshot_id)
+            if snapshot is None:
+                raise HTTPException(status_code=410, detail="Cursor expired, start again from the first page")
+            return await discover_cursor_page(current_user, snapshot, offset, limit)
+        
+        # A truncated precomputed list serves a page only if it reaches that far;
+        # a cursor session ranks everything, so it needs the whole list
+        needed = DISCOVER_SNAPSHOT_MAX_CANDIDATES if paginate == "cursor" else page * limit
+        users, scores, total = await load_discover_candidates(current_user, radius, needed)
+        # Ranked by displayed (rounded) score
+        ranking = [round(score, 1) for score in scores]
+        
+        if paginate == "cursor":
+            # Full stable ranking, computed once per session and cached
+            order = sorted(range(len(users)), key=ranking.__getitem__, reverse=True)
+            order = order[:DISCOVER_SNAPSHOT_MAX_CANDIDATES]
+            snapshot = make_discover_snapshot(users, scores, order)
+            await save_discover_snapshot(current_user["id"], snapshot)
+            return await discover_cursor_page(current_user, snapshot, 0, limit)
+        
+        # Top-K: nlargest is stable like sort(reverse=True), ties keep distance order
         start = (page - 1) * limit
         end = start + limit
-        paginated = candidates[start:end]
+        top = heapq.nlargest(end, range(len(users)), key=ranking.__getitem__)[start:end]
+        
+        # Load full profiles only for the rows on this page
+        paginated = await build_discover_page(
+            [(users[i]["_id"], users[i]["distance"] / 1000, scores[i]) for i in top]
+        )
         
         return {
             "users": paginated,
-            "total": len(candidates),
+            "total": total,
             "page": page,
-            "total_pages": math.ceil(len(candidates) / limit)
+            "total_pages": math.ceil(total / limit)
         }
     except HTTPException:
         raise
@@ -630,6 +1106,26 @@ async def discover_users(radius: int = 50, page: int = 1, limit: int = 20, curre
         logger.error(f"Discover error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def discover_cursor_page(current_user: dict, snapshot: dict, offset: int, limit: int) -> dict:
+    """One page of a ranked discover snapshot"""
+    # Users swiped on or blocked since the snapshot was taken are skipped
+    seen, blocked = await asyncio.gather(
+        seen_store.get(current_user["id"]),
+        block_index.blocked_with(current_user["id"])
+    )
+    entries = [
+        entry for entry in snapshot_entries(snapshot, offset, offset + limit)
+        if str(entry[0]) not in seen and str(entry[0]) not in blocked
+    ]
+    
+    next_offset = offset + limit
+    has_more = next_offset < snapshot["size"]
+    return {
+        "users": await build_discover_page(entries),
+        "total": snapshot["size"],
+        "next_cursor": encode_discover_cursor(snapshot["id"], next_offset) if has_more else None
+    }
+
 def calculate_age(date_of_birth: str) -> int:
     """Calculate age from date of birth"""
     try:
@@ -640,59 +1136,95 @@ def calculate_age(date_of_birth: str) -> int:
     except:
         return 0
 
+def pair_match_id(user_a_id: str, user_b_id: str) -> ObjectId:
+    """Deterministic match _id for an unordered user pair, so concurrent
+    mutual likes upsert the same match instead of creating two"""
+    pair = ":".join(sorted((user_a_id, user_b_id)))
+    return ObjectId(hashlib.sha256(pair.encode()).digest()[:12])
+
+async def bulk_upsert(collection, requests: list) -> set:
+    """Run upserts in one unordered bulk_write; indexes of the requests that
+    inserted a document. Duplicate-key races count as already existing."""
+    if not requests:
+        return set()
+    try:
+        result = await collection.bulk_write(requests, ordered=False)
+        return set(result.upserted_ids)
+    except BulkWriteError as e:
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+        return {upserted["index"] for upserted in e.details["upserted"]}
+
+async def create_matches(user_id: str, other_ids: List[str]) -> Dict[str, ObjectId]:
+    """Idempotently create the match and chat for each mutual like of user_id;
+    {other user id: match id}"""
+    match_ids = {other_id: pair_match_id(user_id, other_id) for other_id in other_ids}
+    now = datetime.utcnow()
+    created, _ = await asyncio.gather(
+        bulk_upsert(db.matches, [
+            UpdateOne(
+                {"_id": match_id},
+                {"$setOnInsert": {"user_a_id": user_id, "user_b_id": other_id, "matched_at": now}},
+                upsert=True
+            )
+            for other_id, match_id in match_ids.items()
+        ]),
+        bulk_upsert(db.chats, [
+            UpdateOne(
+                {"match_id": str(match_id)},
+                {"$setOnInsert": {
+                    "user_a_id": user_id,
+                    "user_b_id": other_id,
+                    "last_message": None,
+                    "updated_at": now
+                }},
+                upsert=True
+            )
+            for other_id, match_id in match_ids.items()
+        ])
+    )
+    
+    # Only the request that actually created a match (not the loser of a race) records it
+    for i, other_id in enumerate(match_ids):
+        if i in created:
+            await record_match_partners(user_id, other_id)
+    return match_ids
+
 @api_router.post("/like")
 async def like_user(like_data: LikeUser, current_user: dict = Depends(get_current_user)):
     """Like a user (swipe right)"""
     try:
         target_user_id = like_data.target_user_id
         
-        # Check if already liked
-        existing_like = await db.likes.find_one({
-            "from_user_id": current_user["id"],
-            "to_user_id": target_user_id
-        })
-        
-        if existing_like:
+        # Create like; the unique (from_user_id, to_user_id) index makes repeats a no-op
+        try:
+            like_result = await db.likes.update_one(
+                {"from_user_id": current_user["id"], "to_user_id": target_user_id},
+                {"$setOnInsert": {"created_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except DuplicateKeyError:
             return {"message": "Already liked", "match": False}
         
-        # Create like
-        like_doc = {
-            "from_user_id": current_user["id"],
-            "to_user_id": target_user_id,
-            "created_at": datetime.utcnow()
-        }
-        await db.likes.insert_one(like_doc)
+        if like_result.upserted_id is None:
+            return {"message": "Already liked", "match": False}
         
         # Check for mutual like
-        reverse_like = await db.likes.find_one({
-            "from_user_id": target_user_id,
-            "to_user_id": current_user["id"]
-        })
+        reverse_like, _ = await asyncio.gather(
+            db.likes.find_one(
+                {"from_user_id": target_user_id, "to_user_id": current_user["id"]},
+                {"_id": 1}
+            ),
+            seen_store.add(current_user["id"], [target_user_id])
+        )
         
         if reverse_like:
-            # Create match
-            match_doc = {
-                "user_a_id": current_user["id"],
-                "user_b_id": target_user_id,
-                "matched_at": datetime.utcnow()
-            }
-            match_result = await db.matches.insert_one(match_doc)
-            match_id = str(match_result.inserted_id)
-            
-            # Create chat
-            chat_doc = {
-                "match_id": match_id,
-                "user_a_id": current_user["id"],
-                "user_b_id": target_user_id,
-                "last_message": None,
-                "updated_at": datetime.utcnow()
-            }
-            await db.chats.insert_one(chat_doc)
+            match_id = (await create_matches(current_user["id"], [target_user_id]))[target_user_id]
             
             return {
                 "message": "It's a match!",
                 "match": True,
-                "match_id": match_id
+                "match_id": str(match_id)
             }
         
         return {"message": "Like sent", "match": False}
@@ -700,42 +1232,130 @@ async def like_user(like_data: LikeUser, current_user: dict = Depends(get_curren
         logger.error(f"Like error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.post("/pass")
+async def pass_user(like_data: LikeUser, current_user: dict = Depends(get_current_user)):
+    """Pass on a user (swipe left)"""
+    try:
+        pass_result = await db.passes.update_one(
+            {"from_user_id": current_user["id"], "to_user_id": like_data.target_user_id},
+            {"$setOnInsert": {"created_at": datetime.utcnow()}},
+            upsert=True
+        )
+        if pass_result.upserted_id is not None:
+            await seen_store.add(current_user["id"], [like_data.target_user_id])
+        return {"message": "Pass recorded"}
+    except DuplicateKeyError:
+        return {"message": "Pass recorded"}
+    except Exception as e:
+        logger.error(f"Pass error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+SWIPE_BATCH_MAX = 100
+
+@api_router.post("/swipes/batch")
+async def swipe_batch(batch: SwipeBatch, current_user: dict = Depends(get_current_user)):
+    """Apply many like/pass decisions at once (e.g. queued while offline)"""
+    if len(batch.swipes) > SWIPE_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {SWIPE_BATCH_MAX} swipes per batch")
+    
+    # Last decision per target wins
+    decisions = {}
+    for swipe in batch.swipes:
+        if swipe.action not in ("like", "pass"):
+            raise HTTPException(status_code=400, detail=f"Invalid swipe action: {swipe.action}")
+        if swipe.target_user_id != current_user["id"]:
+            decisions[swipe.target_user_id] = swipe.action
+    
+    try:
+        liked = [target_id for target_id, action in decisions.items() if action == "like"]
+        passed = [target_id for target_id, action in decisions.items() if action == "pass"]
+        now = datetime.utcnow()
+        
+        def swipe_upserts(target_ids):
+            return [
+                UpdateOne(
+                    {"from_user_id": current_user["id"], "to_user_id": target_id},
+                    {"$setOnInsert": {"created_at": now}},
+                    upsert=True
+                )
+                for target_id in target_ids
+            ]
+        
+        new_like_indexes, new_pass_indexes = await asyncio.gather(
+            bulk_upsert(db.likes, swipe_upserts(liked)),
+            bulk_upsert(db.passes, swipe_upserts(passed))
+        )
+        new_likes = [liked[i] for i in sorted(new_like_indexes)]
+        await seen_store.add(current_user["id"], new_likes + [passed[i] for i in sorted(new_pass_indexes)])
+        
+        # Every mutual like among the new likes in one query
+        mutual = []
+        if new_likes:
+            reverse_cursor = db.likes.find(
+                {"from_user_id": {"$in": new_likes}, "to_user_id": current_user["id"]},
+                {"from_user_id": 1, "_id": 0}
+            )
+            mutual = [like["from_user_id"] async for like in reverse_cursor]
+        
+        match_ids = await create_matches(current_user["id"], mutual) if mutual else {}
+        
+        return {
+            "liked": len(new_likes),
+            "passed": len(new_pass_indexes),
+            "matches": [
+                {"user_id": user_id, "match_id": str(match_id)}
+                for user_id, match_id in match_ids.items()
+            ]
+        }
+    except Exception as e:
+        logger.error(f"Swipe batch error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @api_router.get("/matches")
-async def get_matches(current_user: dict = Depends(get_current_user)):
-    """Get user matches"""
+async def get_matches(page: int = 1, limit: int = 50, current_user: dict = Depends(get_current_user)):
+    """Get user matches, most recent chat activity first"""
     try:
-        # Find all matches involving current user
-        matches_cursor = db.matches.find({
+        # Chats carry both user ids and last activity, so they drive the page;
+        # blocked users are excluded in the query so skip/limit count only visible chats
+        blocked = list(await block_index.blocked_with(current_user["id"]))
+        chats_cursor = db.chats.find({
             "$or": [
-                {"user_a_id": current_user["id"]},
-                {"user_b_id": current_user["id"]}
+                {"user_a_id": current_user["id"], "user_b_id": {"$nin": blocked}},
+                {"user_b_id": current_user["id"], "user_a_id": {"$nin": blocked}}
             ]
-        })
-        
-        matches = await matches_cursor.to_list(None)
+        }).sort([("updated_at", -1), ("_id", -1)]).skip((page - 1) * limit).limit(limit + 1)
+        chats = await chats_cursor.to_list(None)
+        has_more = len(chats) > limit
+        chats = chats[:limit]
+        
+        # One $in each for the matches and the other users on this page, issued concurrently
+        other_ids = [
+            chat["user_b_id"] if chat["user_a_id"] == current_user["id"] else chat["user_a_id"]
+            for chat in chats
+        ]
+        matches, other_users = await asyncio.gather(
+            match_loader().load_many(chat["match_id"] for chat in chats),
+            user_loader("list_row").load_many(other_ids)
+        )
         
         result = []
-        for match in matches:
-            # Get other user
-            other_user_id = match["user_b_id"] if match["user_a_id"] == current_user["id"] else match["user_a_id"]
-            other_user = await db.users.find_one({"_id": ObjectId(other_user_id)})
+        for chat, match, other_user in zip(chats, matches, other_users):
+            if not match or not other_user:
+                continue
             
-            if other_user:
-                # Get last message
-                chat = await db.chats.find_one({"match_id": str(match["_id"])})
-                
-                result.append({
-                    "match_id": str(match["_id"]),
-                    "user": {
-                        "id": str(other_user["_id"]),
-                        "name": other_user["name"],
-                        "profile_photo": other_user["profile_photos"][0] if other_user["profile_photos"] else None
-                    },
-                    "last_message": chat.get("last_message") if chat else None,
-                    "matched_at": match["matched_at"]
-                })
+            result.append({
+                "match_id": chat["match_id"],
+                "user": {
+                    "id": str(other_user["_id"]),
+                    "name": other_user["name"],
+                    "profile_photo": image_url(other_user["profile_photos"][0], "thumb") if other_user["profile_photos"] else None
+                },
+                "last_message": chat.get("last_message"),
+                "last_activity": chat["updated_at"],
+                "matched_at": match["matched_at"]
+            })
         
-        return {"matches": result}
+        return {"matches": result, "page": page, "has_more": has_more}
     except Exception as e:
         logger.error(f"Get matches error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -743,23 +1363,68 @@ async def get_matches(current_user: dict = Depends(get_current_user)):
 # CHAT ENDPOINTS
 
 @api_router.get("/chat/{match_id}/messages")
-async def get_messages(match_id: str, page: int = 1, limit: int = 50, current_user: dict = Depends(get_current_user)):
-    """Get chat messages"""
+async def get_messages(
+    match_id: str,
+    page: int = 1,
+    limit: int = 50,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get chat messages
+
+    Without a cursor returns the latest `limit` messages. `before=<message id>`
+    loads older history, `after=<message id>` newer messages; next_cursor is
+    the message id to pass in the same direction for the following page.
+    `page` is only kept for older clients.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+    
     try:
         # Verify match exists and user is part of it
-        match = await db.matches.find_one({"_id": ObjectId(match_id)})
+        match = await match_loader().load(match_id)
         if not match:
             raise HTTPException(status_code=404, detail="Match not found")
         
         if current_user["id"] not in [match["user_a_id"], match["user_b_id"]]:
             raise HTTPException(status_code=403, detail="Not authorized")
         
-        # Get messages
-        messages_cursor = db.messages.find({"match_id": match_id}).sort("created_at", -1).skip((page - 1) * limit).limit(limit)
-        messages = await messages_cursor.to_list(None)
+        other_id = match["user_b_id"] if match["user_a_id"] == current_user["id"] else match["user_a_id"]
+        if await block_index.is_blocked(current_user["id"], other_id):
+            raise HTTPException(status_code=403, detail="Not authorized")
+        
+        # Resolve the cursor message to its (created_at, _id) position in this chat
+        anchor = None
+        cursor_id = before or after
+        if cursor_id:
+            if ObjectId.is_valid(cursor_id):
+                anchor = await db.messages.find_one(
+                    {"_id": ObjectId(cursor_id), "match_id": match_id}, {"created_at": 1}
+                )
+            if anchor is None:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        
+        # Get messages, walking the (match_id, created_at, _id) index from the anchor
+        query = {"match_id": match_id}
+        if after:
+            query.update(newer_than(anchor["created_at"], anchor["_id"]))
+            messages_cursor = db.messages.find(query).sort([("created_at", 1), ("_id", 1)])
+        else:
+            if before:
+                query.update(older_than(anchor["created_at"], anchor["_id"]))
+            messages_cursor = db.messages.find(query).sort([("created_at", -1), ("_id", -1)])
+            if not before and page > 1:
+                messages_cursor = messages_cursor.skip((page - 1) * limit)
+        messages = await messages_cursor.limit(limit + 1).to_list(None)
+        
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        next_cursor = str(messages[-1]["_id"]) if has_more else None
         
         # Reverse to show oldest first
-        messages.reverse()
+        if not after:
+            messages.reverse()
         
         result = []
         for msg in messages:
@@ -772,7 +1437,7 @@ async def get_messages(match_id: str, page: int = 1, limit: int = 50, current_us
                 "is_mine": msg["sender_id"] == current_user["id"]
             })
         
-        return {"messages": result}
+        return {"messages": result, "next_cursor": next_cursor}
     except HTTPException:
         raise
     except Exception as e:
@@ -784,13 +1449,17 @@ async def send_message(match_id: str, message_data: SendMessage, current_user: d
     """Send chat message"""
     try:
         # Verify match
-        match = await db.matches.find_one({"_id": ObjectId(match_id)})
+        match = await match_loader().load(match_id)
         if not match:
             raise HTTPException(status_code=404, detail="Match not found")
         
         if current_user["id"] not in [match["user_a_id"], match["user_b_id"]]:
             raise HTTPException(status_code=403, detail="Not authorized")
         
+        other_id = match["user_b_id"] if match["user_a_id"] == current_user["id"] else match["user_a_id"]
+        if await block_index.is_blocked(current_user["id"], other_id):
+            raise HTTPException(status_code=403, detail="Not authorized")
+        
         # Create message
         message_doc = {
             "match_id": match_id,
@@ -820,30 +1489,63 @@ async def send_message(match_id: str, message_data: SendMessage, current_user: d
 # FEEDS ENDPOINTS
 
 @api_router.get("/feeds")
-async def get_feeds(page: int = 1, limit: int = 20, current_user: dict = Depends(get_current_user)):
-    """Get feeds/timeline"""
+async def get_feeds(
+    page: int = 1,
+    limit: int = 20,
+    mode: str = "public",  # public, timeline
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get feeds/timeline
+
+    public: every public post; timeline: the materialized timeline of your own
+    and your matches' posts. Both are keyset-paginated on (created_at, _id):
+    pass the returned next_cursor to get the following page. `page` without a
+    cursor is kept for older clients.
+    """
+    if mode not in ("public", "timeline"):
+        raise HTTPException(status_code=400, detail="mode must be public or timeline")
+    after = None
+    if cursor:
+        try:
+            after = decode_keyset_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
     try:
-        # Get feeds
-        feeds_cursor = db.feeds.find({"visibility": "public"}).sort("created_at", -1).skip((page - 1) * limit).limit(limit)
-        feeds = await feeds_cursor.to_list(None)
-        
-        # Get user's matches
-        matches_cursor = db.matches.find({
-            "$or": [
-                {"user_a_id": current_user["id"]},
-                {"user_b_id": current_user["id"]}
-            ]
-        })
-        matches = await matches_cursor.to_list(None)
-        matched_user_ids = set()
-        for match in matches:
-            other_id = match["user_b_id"] if match["user_a_id"] == current_user["id"] else match["user_a_id"]
-            matched_user_ids.add(other_id)
+        if mode == "timeline":
+            if after is None and page > 1:
+                raise HTTPException(status_code=400, detail="timeline mode requires cursor pagination")
+            entries, next_cursor = split_page(
+                await feed_timeline.page(current_user["id"], limit + 1, after), limit, id_field="feed_id"
+            )
+            feeds_by_id = {
+                feed["_id"]: feed
+                for feed in await db.feeds.find({"_id": {"$in": [entry["feed_id"] for entry in entries]}}).to_list(None)
+            }
+            feeds = [feeds_by_id[entry["feed_id"]] for entry in entries if entry["feed_id"] in feeds_by_id]
+        else:
+            query = {"visibility": "public"}
+            if after is not None:
+                query.update(older_than(*after))
+            feeds_cursor = db.feeds.find(query).sort([("created_at", -1), ("_id", -1)])
+            if after is None and page > 1:
+                feeds_cursor = feeds_cursor.skip((page - 1) * limit)
+            feeds, next_cursor = split_page(await feeds_cursor.limit(limit + 1).to_list(None), limit)
+        
+        # Match partners are kept on the user document, no per-request matches query
+        matched_user_ids = set(current_user.get("matched_user_ids", []))
+        
+        # All authors in one batched lookup
+        authors, blocked = await asyncio.gather(
+            user_loader("list_row").load_many(feed["user_id"] for feed in feeds),
+            block_index.blocked_with(current_user["id"])
+        )
         
         result = []
-        for feed in feeds:
-            user = await db.users.find_one({"_id": ObjectId(feed["user_id"])})
-            
+        for feed, user in zip(feeds, authors):
+            if user is None or feed["user_id"] in blocked:
+                continue
             # Show real name only if matched
             is_matched = feed["user_id"] in matched_user_ids
             display_name = user["name"] if is_matched else "Anonymous User"
@@ -853,15 +1555,17 @@ async def get_feeds(page: int = 1, limit: int = 20, current_user: dict = Depends
                 "user": {
                     "id": feed["user_id"],
                     "name": display_name,
-                    "profile_photo": user["profile_photos"][0] if is_matched and user["profile_photos"] else None
+                    "profile_photo": image_url(user["profile_photos"][0], "thumb") if is_matched and user["profile_photos"] else None
                 },
                 "content": feed["content"],
-                "images": feed.get("images", []),
+                "images": [image_url(image, "medium") for image in feed.get("images", [])],
                 "created_at": feed["created_at"],
                 "is_mine": feed["user_id"] == current_user["id"]
             })
         
-        return {"feeds": result}
+        return {"feeds": result, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Get feeds error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -873,16 +1577,20 @@ async def create_feed(feed_data: CreateFeed, current_user: dict = Depends(get_cu
         feed_doc = {
             "user_id": current_user["id"],
             "content": feed_data.content,
-            "images": feed_data.images,
+            "images": [await store_image(image) for image in feed_data.images],
             "visibility": "public",
             "created_at": datetime.utcnow()
         }
         result = await db.feeds.insert_one(feed_doc)
+        audience = await users_repo.get(current_user["id"], "feed_audience")
+        await feed_timeline.fan_out(feed_doc, (audience or {}).get("matched_user_ids", []))
         
         return {
             "feed_id": str(result.inserted_id),
             "message": "Feed created successfully"
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Create feed error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -890,8 +1598,9 @@ async def create_feed(feed_data: CreateFeed, current_user: dict = Depends(get_cu
 # PROFILE ENDPOINTS
 
 @api_router.get("/profile")
-async def get_profile(current_user: dict = Depends(get_current_user)):
+async def get_profile(current_user: dict = Depends(get_token_user)):
     """Get current user profile"""
+    photos = current_user if "profile_photos" in current_user else await users_repo.get(current_user["id"], "own_photos")
     return {
         "id": current_user["id"],
         "name": current_user["name"],
@@ -899,7 +1608,7 @@ async def get_profile(current_user: dict = Depends(get_current_user)):
         "username": current_user["username"],
         "age": calculate_age(current_user["date_of_birth"]),
         "gender": current_user["gender"],
-        "profile_photos": current_user["profile_photos"],
+        "profile_photos": [image_url(photo) for photo in photos["profile_photos"]],
         "bio": current_user.get("bio", ""),
         "verified_face": current_user.get("verified_face", False),
         "mbti": current_user.get("mbti"),
@@ -910,12 +1619,40 @@ async def get_profile(current_user: dict = Depends(get_current_user)):
         "assessments_completed": current_user.get("assessments_completed", False)
     }
 
+@api_router.put("/profile/location")
+async def update_location(location: UpdateLocation, current_user: dict = Depends(get_current_user)):
+    """Update user GPS location"""
+    try:
+        await db.users.update_one(
+            {"_id": ObjectId(current_user["id"])},
+            {"$set": {
+                "latitude": location.latitude,
+                "longitude": location.longitude,
+                "location": geo_point(location.latitude, location.longitude),
+                "location_updated_at": datetime.utcnow()
+            }}
+        )
+        invalidate_user_cache(current_user["id"])
+        
+        # Moved: refresh precomputed compatibility lists
+        compat_precomputer.schedule(current_user["id"])
+        if GEO_INDEX_ENABLED:
+            geo_index.upsert(current_user["id"], location.latitude, location.longitude)
+        
+        return {"message": "Location updated successfully", "token": await reissue_access_token(current_user["id"])}
+    except Exception as e:
+        logger.error(f"Update location error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @api_router.get("/profile/{user_id}")
 async def get_user_profile(user_id: str, current_user: dict = Depends(get_current_user)):
     """Get other user profile"""
     try:
-        user = await db.users.find_one({"_id": ObjectId(user_id)})
-        if not user:
+        user, blocked = await asyncio.gather(
+            user_loader("public_profile").load(user_id),
+            block_index.blocked_with(current_user["id"])
+        )
+        if not user or user_id in blocked:
             raise HTTPException(status_code=404, detail="User not found")
         
         return {
@@ -924,7 +1661,7 @@ async def get_user_profile(user_id: str, current_user: dict = Depends(get_curren
             "username": user["username"],
             "age": calculate_age(user["date_of_birth"]),
             "gender": user["gender"],
-            "profile_photos": user["profile_photos"],
+            "profile_photos": [image_url(photo) for photo in user["profile_photos"]],
             "bio": user.get("bio", ""),
             "verified_face": user.get("verified_face", False),
             "mbti": user.get("mbti"),
@@ -932,10 +1669,132 @@ async def get_user_profile(user_id: str, current_user: dict = Depends(get_curren
             "temperament": user.get("temperament"),
             "disc": user.get("disc")
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Get user profile error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# IMAGE ENDPOINTS
+
+class BlobFileResponse(Response):
+    """Byte range of a local blob file, sent with zero-copy sendfile when the
+    ASGI server supports the `http.response.zerocopysend` extension"""
+    chunk_size = 64 * 1024
+    
+    def __init__(self, path: Path, offset: int, count: int, status_code: int, headers: dict, media_type: str):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.offset = offset
+        self.count = count
+    
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+        
+        with open(self.path, "rb") as f:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f.fileno(),
+                    "offset": self.offset,
+                    "count": self.count
+                })
+                return
+            
+            f.seek(self.offset)
+            remaining = self.count
+            more_body = True
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(f.read, min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                more_body = remaining > 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+            if more_body:
+                # Empty blob or file shorter than expected: the response must still end
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+def parse_range(range_header: Optional[str], size: int):
+    """(start, end) inclusive for a single `bytes=` range, None for the whole file"""
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    start_text, _, end_text = range_header[6:].strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = min(int(end_text), size - 1) if end_text else size - 1
+        else:
+            start = max(size - int(end_text), 0)  # suffix range: last N bytes
+            end = size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+async def serve_blob(digest: str, request: Request, cache_control: str) -> Response:
+    """Stored blob with ETag / If-None-Match / Range handling"""
+    size = await run_in_threadpool(blob_store.size, digest)
+    if size is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    etag = f'"{digest}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes"
+    }
+    
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    
+    byte_range = parse_range(request.headers.get("range"), size)
+    if byte_range and request.headers.get("if-range") not in (None, etag):
+        byte_range = None  # validator changed: send the full file
+    start, end = byte_range or (0, size - 1)
+    status_code = 206 if byte_range else 200
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    
+    media_type = await run_in_threadpool(blob_store.content_type, digest)
+    path = blob_store.local_path(digest)
+    if path is not None:
+        return BlobFileResponse(path, start, end - start + 1, status_code, headers, media_type)
+    
+    return StreamingResponse(
+        blob_store.iter_range(digest, start, end),
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type
+    )
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+@api_router.api_route("/images/{digest}", methods=["GET", "HEAD"])
+async def get_image(digest: str, request: Request):
+    """Serve a stored image (public, immutable, supports ETag and Range)"""
+    if not is_digest(digest):
+        raise HTTPException(status_code=404, detail="Image not found")
+    return await serve_blob(digest, request, IMMUTABLE_CACHE)
+
+@api_router.api_route("/images/{digest}/{variant}", methods=["GET", "HEAD"])
+async def get_image_variant(digest: str, variant: str, request: Request):
+    """Serve a resized variant (thumb, medium); falls back to the original while it is being generated"""
+    if not is_digest(digest) or variant not in VARIANT_SIZES:
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    variant_digest = await image_pipeline.variant_digest(digest, variant)
+    if variant_digest is None:
+        # Not rendered yet: short cache so clients pick up the variant later
+        return await serve_blob(digest, request, "public, max-age=60")
+    return await serve_blob(variant_digest, request, IMMUTABLE_CACHE)
+
 # REPORT & BLOCK
 
 @api_router.post("/report")
@@ -961,13 +1820,14 @@ async def report_item(report_data: ReportItem, current_user: dict = Depends(get_
 async def block_user(user_id: str, current_user: dict = Depends(get_current_user)):
     """Block user"""
     try:
-        # Add to blocked list
-        await db.users.update_one(
-            {"_id": ObjectId(current_user["id"])},
-            {"$addToSet": {"blocked_users": user_id}}
-        )
+        if user_id == current_user["id"]:
+            raise HTTPException(status_code=400, detail="Cannot block yourself")
+        
+        await block_index.block(current_user["id"], user_id)
         
         return {"message": "User blocked successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Block error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1045,6 +1905,8 @@ async def book_consultation(booking: BookConsultation, current_user: dict = Depe
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(RequestScopeMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -1053,6 +1915,77 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def ensure_indexes():
+    result = await apply_indexes(db)
+    if result["failed"]:
+        logger.error(f"Missing indexes: {', '.join(result['failed'])}; run `python manage.py check-indexes`")
+
+@app.on_event("startup")
+async def migrate_legacy_blocks():
+    # Blocks are only enforced from db.blocks. Runs until one pass completes
+    # (recorded in db.migrations); idempotent, so workers racing on it is harmless
+    try:
+        if await db.migrations.find_one({"_id": "block_lists"}, {"_id": 1}):
+            return
+        migrated = await migrate_block_lists()
+    except Exception as e:
+        logger.error(f"Block list migration error: {str(e)}; run `python manage.py migrate-blocks`")
+        return
+    if migrated:
+        logger.info(f"Migrated {migrated} legacy blocks")
+
+async def sync_geo_index(since: datetime) -> datetime:
+    """Upsert users whose location changed after `since` into the geo index;
+    returns the watermark for the next call"""
+    next_since = datetime.utcnow() - GEO_INDEX_SYNC_OVERLAP
+    users_cursor = users_repo.find(
+        {"location_updated_at": {"$gt": since}, "latitude": {"$type": "number"}, "longitude": {"$type": "number"}},
+        "coordinates"
+    )
+    async for user in users_cursor:
+        geo_index.upsert(str(user["_id"]), user["latitude"], user["longitude"])
+    return next_since
+
+async def geo_index_sync_loop(since: datetime):
+    while True:
+        await asyncio.sleep(GEO_INDEX_SYNC_INTERVAL)
+        try:
+            since = await sync_geo_index(since)
+        except Exception as e:
+            logger.error(f"Geo index sync error: {str(e)}")
+
+@app.on_event("startup")
+async def load_geo_index():
+    global geo_index_sync_task
+    if not GEO_INDEX_ENABLED:
+        return
+    since = datetime.utcnow() - GEO_INDEX_SYNC_OVERLAP
+    users_cursor = users_repo.find(
+        {"latitude": {"$type": "number"}, "longitude": {"$type": "number"}},
+        "coordinates"
+    )
+    async for user in users_cursor:
+        geo_index.upsert(str(user["_id"]), user["latitude"], user["longitude"])
+    logger.info(f"Geo index loaded with {len(geo_index)} users")
+    geo_index_sync_task = asyncio.create_task(geo_index_sync_loop(since))
+
+@app.on_event("startup")
+async def calibrate_password_hashing():
+    if BCRYPT_ROUNDS:
+        return
+    rounds, measured_ms = await password_hasher.calibrate(BCRYPT_TARGET_MS)
+    logger.info(f"bcrypt cost {rounds} ({measured_ms:.0f} ms per hash, target {BCRYPT_TARGET_MS:.0f} ms)")
+
+@app.on_event("startup")
+async def start_compat_precomputer():
+    compat_precomputer.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    if geo_index_sync_task is not None:
+        geo_index_sync_task.cancel()
+    await compat_precomputer.stop()
+    image_pipeline.shutdown()
+    password_hasher.shutdown()
     client.close()
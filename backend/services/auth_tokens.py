@@ -0,0 +1,129 @@
+"""
+Access & Refresh Tokens
+Miluv.app
+
+Access tokens are short-lived JWTs that carry the profile claims read-only
+endpoints need, so those endpoints can answer from the token alone.
+Verified tokens are kept in a small LRU keyed by the token's SHA-256, so a
+client reusing its token skips the signature check entirely until expiry.
+
+Refresh tokens are opaque random strings. Only their SHA-256 is stored (in
+`refresh_tokens`, expired by a TTL index) and every refresh rotates them.
+
+When a user's record changes, mark_stale() makes this process distrust the
+claims of tokens issued before the change until the client refreshes.
+Endpoints that change claims answer with a new access token, so the client
+replacing its token is what keeps other processes from serving stale claims.
+"""
+
+import hashlib
+import secrets
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from jose import JWTError, jwt
+
+from services.ttl_cache import TTLCache
+
+# User fields copied into access tokens
+TOKEN_CLAIM_FIELDS = [
+    "name", "email", "username", "date_of_birth", "gender", "bio",
+    "verified_face", "assessments_completed", "readiness",
+    "mbti", "love_language", "temperament", "disc",
+]
+
+
+class InvalidToken(Exception):
+    """Raised for expired, malformed or revoked tokens"""
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenService:
+    """Issues, verifies and rotates tokens"""
+
+    def __init__(self, db, secret_key: str, algorithm: str = "HS256",
+                 access_ttl: timedelta = timedelta(minutes=15),
+                 refresh_ttl: timedelta = timedelta(days=30),
+                 cache_size: int = 10000):
+        self.db = db
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.access_ttl = access_ttl
+        self.refresh_ttl = refresh_ttl
+        self._verified = TTLCache(maxsize=cache_size, ttl=access_ttl.total_seconds())
+        # user_id -> time of last change; only needs to outlive the tokens issued before it
+        self._stale_since = TTLCache(maxsize=cache_size, ttl=access_ttl.total_seconds())
+
+    # Access tokens
+
+    def issue_access(self, user_id: str, user: dict, photos: Optional[list] = None) -> str:
+        """Signed access token for user_id carrying TOKEN_CLAIM_FIELDS from `user`"""
+        now = time.time()
+        claims = {field: user.get(field) for field in TOKEN_CLAIM_FIELDS}
+        if photos is not None:
+            claims["profile_photos"] = photos
+        # Fractional iat: a token issued right after mark_stale() must compare fresh
+        return jwt.encode(
+            {"sub": user_id, "typ": "access", "iat": now,
+             "exp": int(now + self.access_ttl.total_seconds()), "claims": claims},
+            self.secret_key,
+            algorithm=self.algorithm
+        )
+
+    def verify_access(self, token: str) -> dict:
+        """Payload of a valid access token; InvalidToken otherwise"""
+        key = token_digest(token)
+        payload = self._verified.get(key)
+        if payload is None:
+            try:
+                payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+            except JWTError as e:
+                raise InvalidToken(str(e))
+            if payload.get("sub") is None:
+                raise InvalidToken("Token has no subject")
+            self._verified.set(key, payload)
+        elif payload["exp"] <= time.time():
+            self._verified.pop(key)
+            raise InvalidToken("Token expired")
+        return payload
+
+    def claims_fresh(self, payload: dict) -> bool:
+        """False if the user changed after this token was issued (in this process);
+        tokens from before access tokens carried claims are never fresh"""
+        if "claims" not in payload:
+            return False
+        changed_at = self._stale_since.get(payload["sub"])
+        return changed_at is None or payload.get("iat", 0) > changed_at
+
+    def mark_stale(self, user_id: str):
+        self._stale_since.set(user_id, time.time())
+
+    # Refresh tokens
+
+    async def issue_refresh(self, user_id: str) -> str:
+        token = secrets.token_urlsafe(32)
+        now = datetime.utcnow()
+        await self.db.refresh_tokens.insert_one({
+            "_id": token_digest(token),
+            "user_id": user_id,
+            "created_at": now,
+            "expires_at": now + self.refresh_ttl
+        })
+        return token
+
+    async def rotate_refresh(self, token: str) -> str:
+        """Consume a refresh token (single use); returns its user_id"""
+        doc = await self.db.refresh_tokens.find_one_and_delete({"_id": token_digest(token)})
+        if doc is None or doc["expires_at"] <= datetime.utcnow():
+            raise InvalidToken("Invalid refresh token")
+        return doc["user_id"]
+
+    async def revoke_refresh(self, token: str):
+        await self.db.refresh_tokens.delete_one({"_id": token_digest(token)})
+
+    def stats(self) -> dict:
+        return self._verified.stats()
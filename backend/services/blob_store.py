@@ -0,0 +1,168 @@
+"""
+Content-addressed Blob Storage
+Miluv.app
+
+Images are stored once under the SHA-256 of their bytes; MongoDB documents
+only keep the hex digest. Two backends:
+- LocalBlobStore: files under BLOB_STORE_PATH (default ./blobs)
+- S3BlobStore: any S3-compatible bucket (AWS S3, MinIO, R2, ...)
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Iterator, Optional
+
+import boto3
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+
+
+def is_digest(value) -> bool:
+    return isinstance(value, str) and DIGEST_PATTERN.match(value) is not None
+
+
+def sniff_content_type(header: bytes) -> str:
+    """Content type from the first bytes of an image"""
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, content_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return content_type
+    return "application/octet-stream"
+
+
+class LocalBlobStore:
+    """Blobs as files: <root>/<d[0:2]>/<d[2:4]>/<digest>"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def local_path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.local_path(digest)
+        if path.exists():
+            return digest  # deduplicated
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file and rename so readers never see partial blobs
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return digest
+
+    def size(self, digest: str) -> Optional[int]:
+        try:
+            return self.local_path(digest).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def content_type(self, digest: str) -> str:
+        with open(self.local_path(digest), "rb") as f:
+            return sniff_content_type(f.read(16))
+
+    def read(self, digest: str) -> bytes:
+        return self.local_path(digest).read_bytes()
+
+    def iter_range(self, digest: str, start: int, end: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """Bytes [start, end] inclusive"""
+        with open(self.local_path(digest), "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+
+class S3BlobStore:
+    """Blobs as objects <prefix><digest> in an S3-compatible bucket"""
+
+    def __init__(self, bucket: str, prefix: str = "blobs/", endpoint_url: Optional[str] = None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+            region_name=os.getenv('AWS_REGION', 'ap-southeast-1')
+        )
+
+    def local_path(self, digest: str) -> None:
+        return None
+
+    def _key(self, digest: str) -> str:
+        return f"{self.prefix}{digest}"
+
+    def _head(self, digest: str) -> Optional[dict]:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._key(digest))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        if self._head(digest) is None:
+            self.client.put_object(
+                Bucket=self.bucket,
+                Key=self._key(digest),
+                Body=data,
+                ContentType=sniff_content_type(data[:16])
+            )
+        return digest
+
+    def size(self, digest: str) -> Optional[int]:
+        head = self._head(digest)
+        return head["ContentLength"] if head else None
+
+    def content_type(self, digest: str) -> str:
+        head = self._head(digest)
+        return head.get("ContentType", "application/octet-stream") if head else "application/octet-stream"
+
+    def read(self, digest: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=self._key(digest))["Body"].read()
+
+    def iter_range(self, digest: str, start: int, end: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """Bytes [start, end] inclusive"""
+        response = self.client.get_object(Bucket=self.bucket, Key=self._key(digest), Range=f"bytes={start}-{end}")
+        yield from response["Body"].iter_chunks(chunk_size)
+
+
+def create_blob_store():
+    """Backend selected by BLOB_STORE (local | s3)"""
+    backend = os.getenv('BLOB_STORE', 'local')
+    if backend == 's3':
+        return S3BlobStore(
+            bucket=os.environ['BLOB_STORE_BUCKET'],
+            prefix=os.getenv('BLOB_STORE_PREFIX', 'blobs/'),
+            endpoint_url=os.getenv('BLOB_STORE_ENDPOINT_URL') or None
+        )
+    return LocalBlobStore(os.getenv('BLOB_STORE_PATH', str(Path(__file__).resolve().parent.parent / 'blobs')))
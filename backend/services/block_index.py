@@ -0,0 +1,77 @@
+"""
+Block Index
+Miluv.app
+
+Blocks live in the `blocks` collection, one {blocker_id, blocked_id} document
+per block, indexed in both directions. A block hides the pair from each
+other whichever side created it, so the in-memory index keeps, per user, the
+set of everyone they are blocked with in either direction: filtering a list
+of candidates, authors or chats is one O(1) set lookup per row.
+
+Sets are loaded on first use with a single query and kept in a bounded LRU.
+Blocks made through this process update both sides immediately; the TTL
+bounds how long a block made by another process can take to show up.
+"""
+
+from datetime import datetime
+from typing import FrozenSet, Iterable
+
+from pymongo.errors import DuplicateKeyError
+
+from services.ttl_cache import TTLCache
+
+
+class BlockIndex:
+    """Bidirectional user_id -> blocked-with set, backed by db.blocks"""
+
+    def __init__(self, db, cache_size: int = 50000, cache_ttl: float = 60):
+        self.db = db
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+
+    async def blocked_with(self, user_id: str) -> FrozenSet[str]:
+        """Everyone who blocked user_id or was blocked by them"""
+        blocked = self._cache.get(user_id)
+        if blocked is None:
+            cursor = self.db.blocks.find(
+                {"$or": [{"blocker_id": user_id}, {"blocked_id": user_id}]},
+                {"blocker_id": 1, "blocked_id": 1, "_id": 0}
+            )
+            blocked = frozenset([
+                block["blocked_id"] if block["blocker_id"] == user_id else block["blocker_id"]
+                async for block in cursor
+            ])
+            self._cache.set(user_id, blocked)
+        return blocked
+
+    async def is_blocked(self, user_a_id: str, user_b_id: str) -> bool:
+        return user_b_id in await self.blocked_with(user_a_id)
+
+    async def block(self, blocker_id: str, blocked_id: str) -> bool:
+        """Record a block; False if it already existed"""
+        try:
+            result = await self.db.blocks.update_one(
+                {"blocker_id": blocker_id, "blocked_id": blocked_id},
+                {"$setOnInsert": {"created_at": datetime.utcnow()}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        self._link(blocker_id, blocked_id)
+        self._link(blocked_id, blocker_id)
+        return result.upserted_id is not None
+
+    async def import_blocks(self, blocker_id: str, blocked_ids: Iterable[str]) -> int:
+        """Record many blocks by one user (migration of legacy arrays)"""
+        created = 0
+        for blocked_id in blocked_ids:
+            created += await self.block(blocker_id, blocked_id)
+        return created
+
+    def _link(self, user_id: str, other_id: str):
+        # Only patch sets already cached; uncached users load the new block from the db
+        blocked = self._cache.get(user_id)
+        if blocked is not None:
+            self._cache.set(user_id, blocked | {other_id})
+
+    def stats(self) -> dict:
+        return self._cache.stats()
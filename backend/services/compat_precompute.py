@@ -0,0 +1,178 @@
+"""
+Precomputed Compatibility Service
+Miluv.app
+
+Keeps a top-N list of compatible nearby candidates per user in the
+`compat_topn` collection. Lists are refreshed in the background whenever a
+user registers, submits an assessment or moves, and can be rebuilt from
+scratch with `python manage.py recompute-compat`.
+
+Compatibility is symmetric, so when one user changes we recompute their own
+list and patch their score into the lists of every neighbour in the cell.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from services.compatibility import batch_compatibility_scores
+
+logger = logging.getLogger(__name__)
+
+# Fields needed to score a user (no photos)
+SCORING_FIELDS = {
+    "_id": 1, "location": 1, "assessments_completed": 1,
+    "mbti": 1, "love_language": 1, "readiness": 1, "temperament": 1, "disc": 1, "trait_codes": 1
+}
+
+
+class CompatibilityPrecomputer:
+    """Background pipeline maintaining per-user top-N compatible candidates"""
+
+    def __init__(self, db, cell_radius_km: float = 100, top_n: int = 200):
+        self.db = db
+        self.cell_radius_km = cell_radius_km
+        self.top_n = top_n
+        self._queue: "asyncio.Queue[str]" = asyncio.Queue()
+        self._pending: Dict[str, float] = {}  # user_id -> enqueued at
+        self._worker: Optional[asyncio.Task] = None
+        self.processed = 0
+        self.failed = 0
+        self.last_processed_at: Optional[float] = None
+
+    # Pipeline control
+
+    def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def schedule(self, user_id: str):
+        """Queue a user for recompute; repeated calls before processing coalesce"""
+        if user_id not in self._pending:
+            self._pending[user_id] = time.time()
+            self._queue.put_nowait(user_id)
+
+    async def _run(self):
+        while True:
+            user_id = await self._queue.get()
+            self._pending.pop(user_id, None)
+            try:
+                await self.update_user(user_id)
+                self.processed += 1
+                self.last_processed_at = time.time()
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Compatibility precompute error for {user_id}: {str(e)}")
+
+    # Computation
+
+    async def _neighbours(self, user: dict) -> list:
+        cursor = self.db.users.aggregate([
+            {"$geoNear": {
+                "near": user["location"],
+                "key": "location",
+                "distanceField": "distance",
+                "maxDistance": self.cell_radius_km * 1000,  # meters
+                "spherical": True,
+                "query": {"_id": {"$ne": user["_id"]}, "assessments_completed": True}
+            }},
+            {"$project": {**SCORING_FIELDS, "distance": 1}}
+        ])
+        return await cursor.to_list(None)
+
+    async def _write_own_list(self, user: dict, neighbours: list, scores: list):
+        ranked = sorted(range(len(neighbours)), key=scores.__getitem__, reverse=True)[:self.top_n]
+        await self.db.compat_topn.replace_one(
+            {"_id": user["_id"]},
+            {
+                "candidates": [
+                    {
+                        "user_id": neighbours[i]["_id"],
+                        "distance": neighbours[i]["distance"],  # meters
+                        "compatibility": scores[i]
+                    }
+                    for i in ranked
+                ],
+                # The cell held more than top_n; discover then counts candidates live
+                "truncated": len(neighbours) > self.top_n,
+                "computed_at": datetime.utcnow()
+            },
+            upsert=True
+        )
+
+    async def update_user(self, user_id: str):
+        """Recompute one user's list and patch them into their neighbours' lists"""
+        user = await self.db.users.find_one({"_id": ObjectId(user_id)}, SCORING_FIELDS)
+
+        # Drop stale entries for this user everywhere (they may have moved or changed traits)
+        await self.db.compat_topn.update_many(
+            {"candidates.user_id": ObjectId(user_id)},
+            {"$pull": {"candidates": {"user_id": ObjectId(user_id)}}}
+        )
+
+        if not user or not user.get("assessments_completed") or not user.get("location"):
+            await self.db.compat_topn.delete_one({"_id": ObjectId(user_id)})
+            return
+
+        neighbours = await self._neighbours(user)
+        scores = batch_compatibility_scores(user, neighbours)
+        await self._write_own_list(user, neighbours, scores)
+
+        if neighbours:
+            await self.db.compat_topn.bulk_write([
+                UpdateOne(
+                    {"_id": neighbour["_id"]},
+                    {"$push": {"candidates": {
+                        "$each": [{"user_id": user["_id"], "distance": neighbour["distance"], "compatibility": score}],
+                        "$sort": {"compatibility": -1},
+                        "$slice": self.top_n
+                    }}}
+                )
+                for neighbour, score in zip(neighbours, scores)
+            ], ordered=False)
+
+    async def recompute_all(self, batch_size: int = 500) -> int:
+        """Rebuild every user's list from scratch (backfill)"""
+        started_at = datetime.utcnow()
+        count = 0
+        cursor = self.db.users.find(
+            {"assessments_completed": True, "location": {"$exists": True}},
+            SCORING_FIELDS
+        ).batch_size(batch_size)
+        async for user in cursor:
+            neighbours = await self._neighbours(user)
+            await self._write_own_list(user, neighbours, batch_compatibility_scores(user, neighbours))
+            count += 1
+
+        # Lists not rewritten belong to users that are no longer eligible
+        await self.db.compat_topn.delete_many({"computed_at": {"$lt": started_at}})
+        return count
+
+    async def stats(self) -> dict:
+        """Pipeline health and staleness of the precomputed lists"""
+        now = time.time()
+        oldest = await self.db.compat_topn.find_one({}, {"computed_at": 1}, sort=[("computed_at", 1)])
+        oldest_age = (datetime.utcnow() - oldest["computed_at"]).total_seconds() if oldest else None
+        return {
+            "queue_depth": self._queue.qsize(),
+            # How long the oldest unapplied change has been waiting
+            "staleness_seconds": now - min(self._pending.values()) if self._pending else 0.0,
+            "processed": self.processed,
+            "failed": self.failed,
+            "last_processed_at": self.last_processed_at,
+            "oldest_list_age_seconds": oldest_age
+        }
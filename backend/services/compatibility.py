@@ -0,0 +1,212 @@
+"""
+Compatibility Scoring Service
+Miluv.app
+
+Scalar scorer plus a NumPy batch scorer that rates one user against a whole
+block of candidates in a single pass. Both return identical scores.
+
+Categorical traits are stored on each user as one packed integer
+(`trait_codes`), so a block of candidates becomes arrays with two flat
+np.fromiter passes (codes and readiness) instead of one pass per trait.
+"""
+
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+# MBTI encoded as 4 bits, one per dichotomy (bit set = second letter)
+MBTI_DICHOTOMIES = ("EI", "NS", "TF", "JP")
+MBTI_PARTIAL_WEIGHTS = (0.10, 0.05, 0.05, 0.05)
+
+# Known categorical results, code 0 is reserved for "not taken yet" (None)
+TRAIT_VOCABULARY: Dict[str, Dict[object, int]] = {
+    "love_language": {None: 0, "Gifts": 1, "Words of Affirmation": 2, "Quality Time": 3,
+                      "Physical Touch": 4, "Acts of Service": 5},
+    "temperament": {None: 0, "Sanguine": 1, "Choleric": 2, "Phlegmatic": 3, "Melancholic": 4},
+    "disc": {None: 0, "Dominance": 1, "Influence": 2, "Steadiness": 3, "Compliance": 4},
+}
+
+
+def calculate_compatibility_score(user1: dict, user2: dict) -> float:
+    """Calculate compatibility based on assessment results"""
+    score = 0.0
+
+    # MBTI - 25%
+    if user1.get('mbti') == user2.get('mbti'):
+        score += 0.25
+    elif user1.get('mbti') and user2.get('mbti'):
+        # Similar type adds partial score
+        if user1['mbti'][0] == user2['mbti'][0]:  # Same I/E
+            score += 0.10
+        if user1['mbti'][1] == user2['mbti'][1]:  # Same N/S
+            score += 0.05
+        if user1['mbti'][2] == user2['mbti'][2]:  # Same T/F
+            score += 0.05
+        if user1['mbti'][3] == user2['mbti'][3]:  # Same J/P
+            score += 0.05
+
+    # Love Language - 20%
+    if user1.get('love_language') == user2.get('love_language'):
+        score += 0.20
+    elif user1.get('love_language') and user2.get('love_language'):
+        score += 0.05  # Different but both have preference
+
+    # Readiness - 30% (higher readiness = better match)
+    if user1.get('readiness') and user2.get('readiness'):
+        avg_readiness = (user1['readiness'] + user2['readiness']) / 2
+        score += (avg_readiness / 100) * 0.30
+
+    # Temperament - 15%
+    if user1.get('temperament') == user2.get('temperament'):
+        score += 0.15
+    elif user1.get('temperament') and user2.get('temperament'):
+        score += 0.05
+
+    # DISC - 10%
+    if user1.get('disc') == user2.get('disc'):
+        score += 0.10
+    elif user1.get('disc') and user2.get('disc'):
+        score += 0.03
+
+    return min(score * 100, 100)  # Convert to percentage
+
+
+def _mbti_codes() -> Dict[str, int]:
+    codes = {}
+    for bits in range(16):
+        mbti = "".join(pair[(bits >> i) & 1] for i, pair in enumerate(MBTI_DICHOTOMIES))
+        codes[mbti] = bits
+    return codes
+
+
+# "INTJ" -> 4-bit code, built once for all 16 types
+MBTI_CODES = _mbti_codes()
+
+# Categorical traits packed into one int, stored on the user document as
+# `trait_codes` by submit_assessment: 5 bits MBTI (0 = not encodable,
+# 1 = not taken, 2-17 = type), then 4 bits each for the TRAIT_VOCABULARY codes
+MBTI_BITS = 5
+CATEGORY_BITS = 4
+UNENCODABLE = 0
+
+
+def encode_traits(user: dict) -> int:
+    """Packed trait codes of a user; UNENCODABLE if some value is not one
+    the vectorized scorer can represent exactly"""
+    mbti = user.get('mbti')
+    if mbti is None:
+        packed = 1
+    elif isinstance(mbti, str) and mbti in MBTI_CODES:
+        packed = MBTI_CODES[mbti] + 2
+    else:
+        return UNENCODABLE
+
+    shift = MBTI_BITS
+    for trait, vocabulary in TRAIT_VOCABULARY.items():
+        value = user.get(trait)
+        if not isinstance(value, (str, type(None))) or value not in vocabulary:
+            return UNENCODABLE
+        packed |= vocabulary[value] << shift
+        shift += CATEGORY_BITS
+
+    readiness = user.get('readiness')
+    if readiness is not None and (isinstance(readiness, bool) or not isinstance(readiness, (int, float))):
+        return UNENCODABLE
+    return packed
+
+
+def _readiness_array(users: Sequence[dict]) -> np.ndarray:
+    try:
+        return np.fromiter((user.get('readiness') or 0.0 for user in users), dtype=np.float64, count=len(users))
+    except (TypeError, ValueError):
+        # Some non-numeric readiness; those rows are UNENCODABLE anyway
+        return np.array([
+            value if isinstance(value, (int, float)) and value else 0.0
+            for value in (user.get('readiness') for user in users)
+        ], dtype=np.float64)
+
+
+class TraitBlock:
+    """Assessment traits of a block of users as small integer/float arrays"""
+
+    def __init__(self, users: Sequence[dict]):
+        self.size = len(users)
+        # Users without stored codes (not backfilled yet) are encoded here
+        packed = np.fromiter(
+            (user.get('trait_codes') if user.get('trait_codes') is not None else encode_traits(user)
+             for user in users),
+            dtype=np.int32, count=self.size
+        )
+
+        mbti = packed & ((1 << MBTI_BITS) - 1)
+        self.fallback = mbti == UNENCODABLE
+        self.mbti_missing = mbti == 1
+        self.mbti_present = mbti >= 2
+        self.mbti_bits = np.maximum(mbti - 2, 0)
+
+        self.readiness = _readiness_array(users)
+        self.readiness_present = self.readiness != 0
+
+        self.codes = {}
+        self.present = {}
+        shift = MBTI_BITS
+        for trait in TRAIT_VOCABULARY:
+            self.codes[trait] = (packed >> shift) & ((1 << CATEGORY_BITS) - 1)
+            # Code 0 is None; every vocabulary value is a non-empty string
+            self.present[trait] = self.codes[trait] != 0
+            shift += CATEGORY_BITS
+
+
+def _categorical(block: TraitBlock, me: TraitBlock, trait: str, equal: float, partial: float) -> np.ndarray:
+    same = block.codes[trait] == me.codes[trait][0]
+    both = block.present[trait] & me.present[trait][0]
+    return np.where(same, equal, np.where(both, partial, 0.0))
+
+
+def score_block(me: TraitBlock, block: TraitBlock) -> np.ndarray:
+    """Compatibility of the single-row block `me` against every row of `block`
+
+    Additions happen in the same order as the scalar function so the
+    float results match bit for bit.
+    """
+    score = np.zeros(block.size, dtype=np.float64)
+
+    # MBTI - 25%: whole type equal, otherwise per-dichotomy partial credit
+    both_mbti = block.mbti_present & me.mbti_present[0]
+    same_mbti = (both_mbti & (block.mbti_bits == me.mbti_bits[0])) | (block.mbti_missing & me.mbti_missing[0])
+    diff = block.mbti_bits ^ me.mbti_bits[0]
+    partial = np.zeros(block.size, dtype=np.float64)
+    for bit, weight in enumerate(MBTI_PARTIAL_WEIGHTS):
+        partial += np.where((diff >> bit) & 1, 0.0, weight)
+    score += np.where(same_mbti, 0.25, np.where(both_mbti, partial, 0.0))
+
+    # Love Language - 20%
+    score += _categorical(block, me, 'love_language', 0.20, 0.05)
+
+    # Readiness - 30%
+    both_ready = block.readiness_present & me.readiness_present[0]
+    avg_readiness = (me.readiness[0] + block.readiness) / 2
+    score += np.where(both_ready, (avg_readiness / 100) * 0.30, 0.0)
+
+    # Temperament - 15%
+    score += _categorical(block, me, 'temperament', 0.15, 0.05)
+
+    # DISC - 10%
+    score += _categorical(block, me, 'disc', 0.10, 0.03)
+
+    return np.minimum(score * 100, 100)
+
+
+def batch_compatibility_scores(user: dict, candidates: Sequence[dict]) -> List[float]:
+    """Score `user` against all candidates; identical to the scalar function"""
+    if not candidates:
+        return []
+    me = TraitBlock([user])
+    if me.fallback[0]:
+        return [calculate_compatibility_score(user, c) for c in candidates]
+
+    block = TraitBlock(candidates)
+    scores = score_block(me, block).tolist()
+    for i in np.flatnonzero(block.fallback):
+        scores[i] = calculate_compatibility_score(user, candidates[i])
+    return scores
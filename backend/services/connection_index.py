@@ -0,0 +1,98 @@
+"""
+Socket Connection Index
+Miluv.app
+
+Who is connected to this worker, from every direction a handler needs:
+sid -> user, user -> sids (one per device), sid -> rooms and room -> users.
+Connect, join, leave and disconnect touch only the entries of the sid
+involved, so a disconnect costs O(rooms of that sid) however many users are
+online - mass reconnects after a deploy stay linear in the number of sockets.
+
+A user is in a room while at least one of their devices is; a user is
+connected while at least one device is.
+"""
+
+from typing import Dict, List, Optional, Set, Tuple
+
+
+class ConnectionIndex:
+    """Bidirectional sid/user/room index for one Socket.IO worker"""
+
+    def __init__(self):
+        self._sid_user: Dict[str, str] = {}
+        self._user_sids: Dict[str, Set[str]] = {}
+        self._sid_rooms: Dict[str, Dict[str, str]] = {}  # sid -> {room: user_id}
+        self._room_users: Dict[str, Dict[str, int]] = {}  # room -> {user_id: devices in room}
+
+    def connect(self, sid: str, user_id: str) -> bool:
+        """Register a device; True if it is the user's first one here"""
+        self._sid_user[sid] = user_id
+        sids = self._user_sids.setdefault(user_id, set())
+        sids.add(sid)
+        return len(sids) == 1
+
+    def disconnect(self, sid: str) -> Tuple[Optional[str], bool, List[str]]:
+        """Forget a sid: (user_id, True if that was their last device,
+        rooms the user is no longer in)"""
+        left_rooms = [room for room in list(self._sid_rooms.get(sid, {})) if self.leave(sid, room)]
+        self._sid_rooms.pop(sid, None)
+
+        user_id = self._sid_user.pop(sid, None)
+        if user_id is None:
+            return None, False, left_rooms
+        sids = self._user_sids[user_id]
+        sids.discard(sid)
+        if not sids:
+            del self._user_sids[user_id]
+        return user_id, not sids, left_rooms
+
+    def join(self, sid: str, room: str, user_id: str) -> bool:
+        """Add a sid to a room on behalf of user_id; True if the user was
+        not in the room yet"""
+        rooms = self._sid_rooms.setdefault(sid, {})
+        if room in rooms:
+            return False
+        rooms[room] = user_id
+        users = self._room_users.setdefault(room, {})
+        users[user_id] = users.get(user_id, 0) + 1
+        return users[user_id] == 1
+
+    def leave(self, sid: str, room: str) -> bool:
+        """Remove a sid from a room; True if the user has left it entirely"""
+        user_id = self._sid_rooms.get(sid, {}).pop(room, None)
+        if user_id is None:
+            return False
+        users = self._room_users[room]
+        users[user_id] -= 1
+        if users[user_id]:
+            return False
+        del users[user_id]
+        if not users:
+            del self._room_users[room]
+        return True
+
+    def user(self, sid: str) -> Optional[str]:
+        return self._sid_user.get(sid)
+
+    def sids(self, user_id: str) -> Set[str]:
+        return set(self._user_sids.get(user_id, ()))
+
+    def rooms(self, sid: str) -> Set[str]:
+        return set(self._sid_rooms.get(sid, ()))
+
+    def room_users(self, room: str) -> Set[str]:
+        return set(self._room_users.get(room, ()))
+
+    def is_connected(self, user_id: str) -> bool:
+        return user_id in self._user_sids
+
+    def users(self) -> Dict[str, Set[str]]:
+        """user_id -> sids, copied"""
+        return {user_id: set(sids) for user_id, sids in self._user_sids.items()}
+
+    def stats(self) -> dict:
+        return {
+            "sids": len(self._sid_user),
+            "users": len(self._user_sids),
+            "rooms": len(self._room_users),
+        }
@@ -0,0 +1,76 @@
+"""
+Request-scoped Batching Loader
+Miluv.app
+
+DataLoader-style helper: every load(key) made in the same event-loop tick is
+coalesced into one batch call (a single `$in` query), and results are
+memoized for the life of the loader, which is one request.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List
+
+
+class DataLoader:
+    """Coalesce and memoize key lookups
+
+    batch_load_fn receives a list of unique keys and returns {key: value};
+    keys missing from the result load as None.
+    """
+
+    def __init__(self, batch_load_fn: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+                 max_batch_size: int = 1000):
+        self.batch_load_fn = batch_load_fn
+        self.max_batch_size = max_batch_size
+        self._cache: Dict[Hashable, asyncio.Future] = {}
+        self._queue: List[Hashable] = []
+        self._dispatch_scheduled = False
+
+    def load(self, key: Hashable) -> "asyncio.Future":
+        future = self._cache.get(key)
+        if future is not None:
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._cache[key] = future
+        self._queue.append(key)
+        if not self._dispatch_scheduled:
+            # Runs after every task that is ready this tick has queued its keys
+            self._dispatch_scheduled = True
+            loop.call_soon(self._dispatch)
+        return future
+
+    async def load_many(self, keys: Iterable[Hashable]) -> List[Any]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def prime(self, key: Hashable, value: Any):
+        """Seed the cache with a value loaded elsewhere"""
+        if key not in self._cache:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(value)
+            self._cache[key] = future
+
+    def clear(self, key: Hashable):
+        self._cache.pop(key, None)
+
+    def _dispatch(self):
+        keys, self._queue = self._queue, []
+        self._dispatch_scheduled = False
+        for i in range(0, len(keys), self.max_batch_size):
+            asyncio.ensure_future(self._load_batch(keys[i:i + self.max_batch_size]))
+
+    async def _load_batch(self, keys: List[Hashable]):
+        try:
+            values = await self.batch_load_fn(keys)
+        except Exception as e:
+            for key in keys:
+                future = self._cache.pop(key, None)  # failed loads may be retried
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+
+        for key in keys:
+            future = self._cache[key]
+            if not future.done():
+                future.set_result(values.get(key))
@@ -0,0 +1,89 @@
+"""
+Materialized Feed Timelines
+Miluv.app
+
+Fan-out-on-write: when a post is created its id is written into the
+`timelines` collection once per audience member (the author and everyone
+they are matched with). Reading a timeline is then a single indexed range
+scan on (owner_id, created_at, feed_id) instead of a sort over all feeds
+(indexes are declared in services/indexes.py).
+
+Timeline entries carry the feed's created_at so they sort exactly like the
+feeds themselves and share the same keyset cursor.
+"""
+
+from typing import Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from services.keyset import older_than
+
+# Posts copied into each other's timelines when two users match
+MATCH_BACKFILL_POSTS = 50
+
+
+class FeedTimeline:
+    """Writes and reads per-user feed timelines"""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def fan_out(self, feed: dict, audience: Iterable[str]) -> int:
+        """Insert one feed into the timeline of every audience member"""
+        owners = set(audience)
+        owners.add(feed["user_id"])
+        return await self._write([(owner_id, feed) for owner_id in owners])
+
+    async def on_match(self, user_a_id: str, user_b_id: str) -> int:
+        """Copy each user's recent posts into the other's timeline"""
+        entries = []
+        for owner_id, author_id in ((user_a_id, user_b_id), (user_b_id, user_a_id)):
+            recent = self.db.feeds.find(
+                {"user_id": author_id, "visibility": "public"},
+                {"user_id": 1, "created_at": 1}
+            ).sort([("created_at", -1), ("_id", -1)]).limit(MATCH_BACKFILL_POSTS)
+            async for feed in recent:
+                entries.append((owner_id, feed))
+        return await self._write(entries)
+
+    async def _write(self, entries: List[tuple]) -> int:
+        if not entries:
+            return 0
+        result = await self.db.timelines.bulk_write([
+            UpdateOne(
+                {"owner_id": owner_id, "feed_id": feed["_id"]},
+                {"$setOnInsert": {"author_id": feed["user_id"], "created_at": feed["created_at"]}},
+                upsert=True
+            )
+            for owner_id, feed in entries
+        ], ordered=False)
+        return result.upserted_count
+
+    async def page(self, owner_id: str, limit: int,
+                   after: Optional[tuple] = None) -> List[dict]:
+        """Up to `limit` entries newest first, starting after (created_at, feed_id)"""
+        query = {"owner_id": owner_id}
+        if after is not None:
+            query.update(older_than(*after, id_field="feed_id"))
+        cursor = self.db.timelines.find(query, {"feed_id": 1, "created_at": 1}) \
+            .sort([("created_at", -1), ("feed_id", -1)]).limit(limit)
+        return await cursor.to_list(None)
+
+    async def backfill(self, batch_size: int = 500) -> int:
+        """Backfill every timeline from feeds and users.matched_user_ids"""
+        audiences = {}
+        async for user in self.db.users.find({}, {"matched_user_ids": 1}).batch_size(batch_size):
+            audiences[str(user["_id"])] = user.get("matched_user_ids", [])
+
+        written = 0
+        batch = []
+        feeds = self.db.feeds.find({"visibility": "public"}, {"user_id": 1, "created_at": 1})
+        async for feed in feeds.batch_size(batch_size):
+            owners = set(audiences.get(feed["user_id"], []))
+            owners.add(feed["user_id"])
+            batch.extend((owner_id, feed) for owner_id in owners)
+            if len(batch) >= batch_size:
+                written += await self._write(batch)
+                batch = []
+        written += await self._write(batch)
+        return written
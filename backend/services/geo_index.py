@@ -0,0 +1,151 @@
+"""
+In-process Geohash Spatial Index
+Miluv.app
+
+Buckets users into a fixed-precision geohash grid so "who is within R km"
+only looks at the cells overlapping the search circle instead of every user.
+Supports incremental insert / move / delete as users register or update
+their location.
+
+Cells are addressed by their integer (row, col) in the grid rather than by
+geohash string, so the cells covering a search box are plain index ranges
+and no hashing happens per query.
+"""
+
+import math
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+
+def cell_size_degrees(precision: int) -> Tuple[float, float]:
+    """(lat, lon) size in degrees of a geohash cell at this precision"""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = math.floor(precision * 5 / 2)
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in km between two coordinates"""
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lon = math.radians(lon2 - lon1)
+    a = math.sin(delta_lat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+class GeoIndex:
+    """Geohash grid of user_id -> (lat, lon)
+
+    Precision 5 cells are roughly 4.9 x 4.9 km at the equator, a good fit for
+    discover radii of a few to a few hundred km.
+    """
+
+    def __init__(self, precision: int = 5):
+        self.precision = precision
+        self.cell_lat, self.cell_lon = cell_size_degrees(precision)
+        self.rows = round(180.0 / self.cell_lat)
+        self.cols = round(360.0 / self.cell_lon)
+        # row * cols + col -> {user_id: (lat radians, lon radians, cos lat)}
+        self._cells: Dict[int, Dict[str, Tuple[float, float, float]]] = {}
+        # Same members as (ids, 3 x n array), built on first query after a change
+        self._packed: Dict[int, Tuple[List[str], np.ndarray]] = {}
+        self._points: Dict[str, Tuple[float, float, int]] = {}  # user_id -> (lat, lon, cell)
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._points
+
+    def _row(self, latitude: float) -> int:
+        return min(max(int((latitude + 90.0) / self.cell_lat), 0), self.rows - 1)
+
+    def _col(self, longitude: float) -> int:
+        return int(math.floor((longitude + 180.0) / self.cell_lon)) % self.cols
+
+    def upsert(self, user_id: str, latitude: float, longitude: float):
+        """Insert a user or move them to a new location"""
+        cell = self._row(latitude) * self.cols + self._col(longitude)
+        previous = self._points.get(user_id)
+        if previous is not None and previous[2] != cell:
+            self._discard_from_cell(user_id, previous[2])
+        self._points[user_id] = (latitude, longitude, cell)
+        lat_rad = math.radians(latitude)
+        self._cells.setdefault(cell, {})[user_id] = (lat_rad, math.radians(longitude), math.cos(lat_rad))
+        self._packed.pop(cell, None)
+
+    def remove(self, user_id: str):
+        previous = self._points.pop(user_id, None)
+        if previous is not None:
+            self._discard_from_cell(user_id, previous[2])
+
+    def _discard_from_cell(self, user_id: str, cell: int):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.pop(user_id, None)
+            self._packed.pop(cell, None)
+            if not members:
+                del self._cells[cell]
+
+    def _covering_cells(self, latitude: float, longitude: float, radius_km: float) -> Iterable[int]:
+        """Grid cells overlapping the bounding box of the search circle"""
+        lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+        min_lat = max(latitude - lat_delta, -90.0)
+        max_lat = min(latitude + lat_delta, 90.0)
+
+        # Longitude span widens towards the poles; give up on the box near them
+        cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+        if cos_lat <= 1e-9:
+            lon_delta = 180.0
+        else:
+            lon_delta = min(math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)), 180.0)
+
+        rows = range(self._row(min_lat), self._row(max_lat) + 1)
+        first_col = int(math.floor((longitude - lon_delta + 180.0) / self.cell_lon))
+        last_col = int(math.floor((longitude + lon_delta + 180.0) / self.cell_lon))
+        cols = range(self.cols) if last_col - first_col + 1 >= self.cols else \
+            [col % self.cols for col in range(first_col, last_col + 1)]  # wraps the antimeridian
+
+        # Too many cells to enumerate: scanning the occupied ones is cheaper
+        if len(rows) * len(cols) > len(self._cells):
+            return list(self._cells)
+        return [row * self.cols + col for row in rows for col in cols]
+
+    def _packed_cell(self, cell: int) -> Optional[Tuple[List[str], np.ndarray]]:
+        packed = self._packed.get(cell)
+        if packed is None:
+            members = self._cells.get(cell)
+            if not members:
+                return None
+            packed = (list(members), np.array(list(members.values())).T)
+            self._packed[cell] = packed
+        return packed
+
+    def within(self, latitude: float, longitude: float, radius_km: float,
+               exclude: Optional[str] = None) -> List[Tuple[str, float]]:
+        """(user_id, distance_km) of every indexed user within radius_km"""
+        blocks = [
+            packed for packed in map(self._packed_cell, self._covering_cells(latitude, longitude, radius_km))
+            if packed is not None
+        ]
+        if not blocks:
+            return []
+        ids = list(chain.from_iterable(block[0] for block in blocks))
+        lat_rad, lon_rad, cos_lat = np.concatenate([block[1] for block in blocks], axis=1)
+
+        # Haversine over every candidate at once; the radius test compares the
+        # haversine term, so only hits pay for arcsin
+        lat0 = math.radians(latitude)
+        lon0 = math.radians(longitude)
+        a = np.sin((lat_rad - lat0) / 2) ** 2 + math.cos(lat0) * cos_lat * np.sin((lon_rad - lon0) / 2) ** 2
+        hits = np.flatnonzero(a <= math.sin(min(radius_km / EARTH_RADIUS_KM, math.pi) / 2) ** 2)
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a[hits]))
+        return [
+            (ids[i], distance) for i, distance in zip(hits.tolist(), distances.tolist())
+            if ids[i] != exclude
+        ]
@@ -0,0 +1,109 @@
+"""
+Image Variant Pipeline
+Miluv.app
+
+Generates resized WebP (or JPEG, if Pillow lacks WebP) variants of uploaded
+photos in a process pool so decoding/resizing never blocks the event loop.
+Variants are stored in the blob store like any other image; the mapping
+original digest -> variant digests lives in the `image_variants` collection.
+"""
+
+import asyncio
+import io
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+from PIL import Image, ImageOps, features
+
+from services.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Variant name -> longest edge in pixels
+VARIANT_SIZES = {
+    "thumb": 160,
+    "medium": 640,
+}
+VARIANT_FORMAT = "WEBP" if features.check("webp") else "JPEG"
+VARIANT_QUALITY = 80
+
+
+def render_variants(data: bytes) -> Dict[str, bytes]:
+    """Resize one image into every variant size (runs in a worker process)"""
+    variants = {}
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original).convert("RGB")
+        for name, size in VARIANT_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, VARIANT_FORMAT, quality=VARIANT_QUALITY)
+            variants[name] = buffer.getvalue()
+    return variants
+
+
+class ImageVariantPipeline:
+    """Background variant generation plus variant digest lookup"""
+
+    def __init__(self, db, blob_store, max_workers: int = 2):
+        self.db = db
+        self.blob_store = blob_store
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tasks = set()
+        # original digest -> {variant: digest}; mappings never change once written
+        self._lookup_cache = TTLCache(maxsize=50000, ttl=24 * 3600)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def generate(self, digest: str) -> Optional[Dict[str, str]]:
+        """Render, store and record all variants of one stored image"""
+        existing = await self.db.image_variants.find_one({"_id": digest})
+        if existing:
+            return existing["variants"]
+
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(None, self.blob_store.read, digest)
+        try:
+            rendered = await loop.run_in_executor(self._pool(), render_variants, data)
+        except Exception as e:
+            logger.error(f"Image variant error for {digest}: {str(e)}")
+            return None
+
+        variants = {}
+        for name, variant_data in rendered.items():
+            variants[name] = await loop.run_in_executor(None, self.blob_store.put, variant_data)
+
+        await self.db.image_variants.update_one(
+            {"_id": digest},
+            {"$setOnInsert": {"variants": variants}},
+            upsert=True
+        )
+        self._lookup_cache.set(digest, variants)
+        return variants
+
+    def schedule(self, digest: str):
+        """Generate variants in the background; the upload request doesn't wait"""
+        task = asyncio.create_task(self.generate(digest))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def variant_digest(self, digest: str, variant: str) -> Optional[str]:
+        """Digest of a variant, or None if it hasn't been generated (yet)"""
+        variants = self._lookup_cache.get(digest)
+        if variants is None:
+            doc = await self.db.image_variants.find_one({"_id": digest})
+            if doc is None:
+                return None
+            variants = doc["variants"]
+            self._lookup_cache.set(digest, variants)
+        return variants.get(variant)
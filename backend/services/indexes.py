@@ -0,0 +1,264 @@
+"""
+MongoDB Index Registry
+Miluv.app
+
+Every index the backend relies on is declared here, next to the query
+shapes it serves. The registry is applied idempotently at startup and by
+`python manage.py ensure-indexes`; `python manage.py check-indexes` reports
+missing, unregistered and unused indexes and runs explain() on each query
+shape to make sure none of them falls back to a collection scan.
+Duplicates left over from before a unique index existed are removed by
+`ensure-indexes` first (see dedupe_unique_indexes).
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("username", ASCENDING)], unique=True),
+        IndexModel([("location", GEOSPHERE)]),
+        # geo index delta sync between workers
+        IndexModel([("location_updated_at", ASCENDING)]),
+    ],
+    "likes": [
+        # like_user upserts on the pair; also covers "everyone I liked"
+        IndexModel([("from_user_id", ASCENDING), ("to_user_id", ASCENDING)], unique=True),
+    ],
+    # Both directions: a block hides the pair from each other
+    "blocks": [
+        IndexModel([("blocker_id", ASCENDING), ("blocked_id", ASCENDING)], unique=True),
+        IndexModel([("blocked_id", ASCENDING), ("blocker_id", ASCENDING)]),
+    ],
+    "passes": [
+        IndexModel([("from_user_id", ASCENDING), ("to_user_id", ASCENDING)], unique=True),
+    ],
+    # matches: _id is derived from the sorted user pair, so it is the uniqueness key
+    "matches": [
+        IndexModel([("user_a_id", ASCENDING)]),
+        IndexModel([("user_b_id", ASCENDING)]),
+    ],
+    "chats": [
+        IndexModel([("match_id", ASCENDING)], unique=True),
+        # get_matches: $or over both sides, merged on last activity
+        IndexModel([("user_a_id", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("user_b_id", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "messages": [
+        IndexModel([("match_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "feeds": [
+        IndexModel([("visibility", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+        # timeline backfill on match: an author's recent posts
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    ],
+    "timelines": [
+        IndexModel([("owner_id", ASCENDING), ("created_at", DESCENDING), ("feed_id", DESCENDING)]),
+        # fan-out upserts, so retries and backfills never duplicate entries
+        IndexModel([("owner_id", ASCENDING), ("feed_id", ASCENDING)], unique=True),
+    ],
+    "refresh_tokens": [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    # Socket.IO pub/sub messages (SOCKET_MANAGER=mongo); only needed while in flight
+    "socket_events": [
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=60),
+    ],
+    # Ranked discover cursor sessions, shared between workers
+    "discover_snapshots": [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "compat_topn": [
+        IndexModel([("candidates.user_id", ASCENDING)]),
+        IndexModel([("computed_at", ASCENDING)]),
+    ],
+}
+
+# Unique indexes whose duplicate documents are interchangeable, so all but the
+# oldest can be deleted. Duplicate users are separate accounts and are only
+# reported; they need merging by hand.
+DEDUPE_COLLECTIONS = {"likes", "passes", "blocks", "chats", "timelines"}
+_DELETE_BATCH = 1000
+
+_SAMPLE_ID = "000000000000000000000000"
+_SAMPLE_TIME = datetime(2024, 1, 1)
+
+# Query shapes issued by the server, checked with explain(). $geoNear is not
+# listed: it refuses to run at all without the 2dsphere index.
+QUERY_SHAPES: List[Dict[str, Any]] = [
+    {"name": "register: email taken", "collection": "users", "filter": {"email": "a@example.com"}},
+    {"name": "register: username taken", "collection": "users", "filter": {"username": "someone"}},
+    {"name": "geo index sync: moved users", "collection": "users",
+     "filter": {"location_updated_at": {"$gt": _SAMPLE_TIME}}},
+    {"name": "blocks with user", "collection": "blocks",
+     "filter": {"$or": [{"blocker_id": _SAMPLE_ID}, {"blocked_id": _SAMPLE_ID}]}},
+    {"name": "seen filter rebuild: likes", "collection": "likes",
+     "filter": {"from_user_id": _SAMPLE_ID}, "projection": {"to_user_id": 1, "_id": 0}},
+    {"name": "like: upsert on pair", "collection": "likes",
+     "filter": {"from_user_id": _SAMPLE_ID, "to_user_id": _SAMPLE_ID}},
+    {"name": "swipe batch: mutual likes", "collection": "likes",
+     "filter": {"from_user_id": {"$in": [_SAMPLE_ID]}, "to_user_id": _SAMPLE_ID}},
+    {"name": "seen filter rebuild: passes", "collection": "passes",
+     "filter": {"from_user_id": _SAMPLE_ID}, "projection": {"to_user_id": 1, "_id": 0}},
+    {"name": "matches by user a", "collection": "matches", "filter": {"user_a_id": _SAMPLE_ID}},
+    {"name": "matches by user b", "collection": "matches", "filter": {"user_b_id": _SAMPLE_ID}},
+    {"name": "chat by match", "collection": "chats", "filter": {"match_id": {"$in": [_SAMPLE_ID]}}},
+    {"name": "get_matches page", "collection": "chats",
+     "filter": {"$or": [{"user_a_id": _SAMPLE_ID, "user_b_id": {"$nin": [_SAMPLE_ID]}},
+                        {"user_b_id": _SAMPLE_ID, "user_a_id": {"$nin": [_SAMPLE_ID]}}]},
+     "sort": [("updated_at", -1), ("_id", -1)]},
+    {"name": "get_messages page", "collection": "messages", "filter": {"match_id": _SAMPLE_ID},
+     "sort": [("created_at", -1), ("_id", -1)]},
+    {"name": "public feeds page", "collection": "feeds", "filter": {"visibility": "public"},
+     "sort": [("created_at", -1), ("_id", -1)]},
+    {"name": "author's recent feeds", "collection": "feeds",
+     "filter": {"user_id": _SAMPLE_ID, "visibility": "public"},
+     "sort": [("created_at", -1), ("_id", -1)]},
+    {"name": "timeline page", "collection": "timelines", "filter": {"owner_id": _SAMPLE_ID},
+     "sort": [("created_at", -1), ("feed_id", -1)]},
+    {"name": "compat lists containing user", "collection": "compat_topn",
+     "filter": {"candidates.user_id": ObjectId()}},
+]
+
+
+def _key(model: IndexModel) -> tuple:
+    return tuple(model.document["key"].items())
+
+
+def _index_name(model: IndexModel) -> str:
+    return model.document["name"]
+
+
+def _collections(names: Optional[Iterable[str]]) -> List[str]:
+    return list(names) if names is not None else list(INDEXES)
+
+
+async def apply_indexes(db, collections: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """Create every registered index that doesn't exist yet
+
+    Existing identical indexes are a no-op. Failures (e.g. duplicate emails
+    blocking a unique index) are collected rather than raised so one bad
+    index doesn't keep the server from starting.
+    """
+    created, failed = [], {}
+    for collection in _collections(collections):
+        for model in INDEXES[collection]:
+            name = f"{collection}.{_index_name(model)}"
+            try:
+                await db[collection].create_indexes([model])
+                created.append(name)
+            except OperationFailure as e:
+                failed[name] = str(e)
+                logger.error(f"Index {name} could not be created: {str(e)}")
+    return {"ensured": created, "failed": failed}
+
+
+async def _duplicate_groups(collection, model: IndexModel) -> List[List[Any]]:
+    """_ids of documents sharing a unique key, oldest first, one list per key"""
+    keys = list(model.document["key"])
+    pipeline = [
+        {"$sort": {"_id": 1}},
+        {"$group": {
+            "_id": {f"k{i}": f"${key}" for i, key in enumerate(keys)},
+            "ids": {"$push": "$_id"},
+            "count": {"$sum": 1},
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    return [group["ids"] async for group in collection.aggregate(pipeline, allowDiskUse=True)]
+
+
+async def dedupe_unique_indexes(db, collections: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """Clear duplicates that would keep a registered unique index from being built
+
+    In DEDUPE_COLLECTIONS the oldest document of each key is kept and the
+    rest deleted; elsewhere the conflicting _ids are only reported.
+    """
+    removed, conflicts = {}, {}
+    for collection in _collections(collections):
+        for model in INDEXES[collection]:
+            if not model.document.get("unique"):
+                continue
+            name = f"{collection}.{_index_name(model)}"
+            groups = await _duplicate_groups(db[collection], model)
+            if not groups:
+                continue
+            if collection not in DEDUPE_COLLECTIONS:
+                conflicts[name] = [[str(_id) for _id in ids] for ids in groups]
+                continue
+            extra = [_id for ids in groups for _id in ids[1:]]
+            deleted = 0
+            for start in range(0, len(extra), _DELETE_BATCH):
+                result = await db[collection].delete_many({"_id": {"$in": extra[start:start + _DELETE_BATCH]}})
+                deleted += result.deleted_count
+            removed[name] = deleted
+            logger.info(f"Removed {deleted} duplicates blocking {name}")
+    return {"removed": removed, "conflicts": conflicts}
+
+
+async def index_report(db, collections: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, List[str]]]:
+    """Per collection: missing registered indexes, unregistered ones, and
+    indexes with no recorded use since the server (or index) started"""
+    report = {}
+    for collection in _collections(collections):
+        registered = {_key(model): _index_name(model) for model in INDEXES[collection]}
+        existing = {}
+        async for index in db[collection].list_indexes():
+            existing[tuple(index["key"].items())] = index["name"]
+
+        usage = {}
+        try:
+            async for stat in db[collection].aggregate([{"$indexStats": {}}]):
+                usage[stat["name"]] = stat["accesses"]["ops"]
+        except OperationFailure:
+            pass  # $indexStats not permitted for this user
+
+        report[collection] = {
+            "missing": [name for key, name in registered.items() if key not in existing],
+            "unregistered": [name for key, name in existing.items() if key not in registered and name != "_id_"],
+            "unused": [name for name in existing.values() if usage.get(name) == 0 and name != "_id_"],
+        }
+    return report
+
+
+def _plan_details(plan: Any, stages: set, index_names: set):
+    """Collect stage and index names from any explain() plan tree"""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.add(plan["stage"])
+        if "indexName" in plan:
+            index_names.add(plan["indexName"])
+        for value in plan.values():
+            _plan_details(value, stages, index_names)
+    elif isinstance(plan, list):
+        for value in plan:
+            _plan_details(value, stages, index_names)
+
+
+async def explain_query_shapes(db) -> List[Dict[str, Any]]:
+    """Winning plan of every registered query shape; `covered` is False on a COLLSCAN"""
+    results = []
+    for shape in QUERY_SHAPES:
+        cursor = db[shape["collection"]].find(shape["filter"], shape.get("projection"))
+        if shape.get("sort"):
+            cursor = cursor.sort(shape["sort"])
+        explain = await cursor.explain()
+
+        stages, index_names = set(), set()
+        _plan_details(explain["queryPlanner"]["winningPlan"], stages, index_names)
+        results.append({
+            "name": shape["name"],
+            "collection": shape["collection"],
+            "covered": "COLLSCAN" not in stages,
+            "stages": sorted(stages),
+            "indexes": sorted(index_names),
+        })
+    return results
@@ -0,0 +1,53 @@
+"""
+Keyset Pagination Helpers
+Miluv.app
+
+Lists sorted newest first by (created_at, _id) are paged by remembering the
+last row instead of counting rows to skip, so deep pages cost the same as
+the first one and concurrent inserts never shift or duplicate rows.
+"""
+
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+def encode_keyset_cursor(created_at: datetime, row_id: ObjectId) -> str:
+    """Opaque cursor pointing just past this row"""
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).decode()
+
+
+def decode_keyset_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """(created_at, _id) of a cursor; ValueError if it is malformed"""
+    try:
+        created_at, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), ObjectId(row_id)
+    except (ValueError, UnicodeDecodeError, InvalidId, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def older_than(created_at: datetime, row_id: ObjectId, id_field: str = "_id") -> dict:
+    """Filter for rows after (created_at, row_id) in (created_at desc, id desc) order"""
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, id_field: {"$lt": row_id}},
+    ]}
+
+
+def newer_than(created_at: datetime, row_id: ObjectId, id_field: str = "_id") -> dict:
+    """Filter for rows after (created_at, row_id) in (created_at asc, id asc) order"""
+    return {"$or": [
+        {"created_at": {"$gt": created_at}},
+        {"created_at": created_at, id_field: {"$gt": row_id}},
+    ]}
+
+
+def split_page(rows: list, limit: int, id_field: str = "_id") -> Tuple[list, Optional[str]]:
+    """(page, next_cursor) from `limit + 1` fetched rows; cursor is None on the last page"""
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_keyset_cursor(page[-1]["created_at"], page[-1][id_field])
@@ -0,0 +1,170 @@
+"""
+Password Hashing Pool
+Miluv.app
+
+bcrypt is deliberately slow (100-300 ms per call). Running it inline in an
+async handler blocks the event loop for that long, stalling every other
+request and websocket on the worker. PasswordHasher runs hash/verify in a
+dedicated, size-bounded thread pool (the bcrypt C extension releases the
+GIL) and sheds load once too many calls are waiting, so a login storm
+degrades into fast 503s instead of an ever-growing queue.
+
+The bcrypt cost can be calibrated on the host at startup: the highest work
+factor whose hash time stays within a latency target is chosen, and weaker
+hashes are transparently rehashed on the next login.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import bcrypt
+
+MIN_BCRYPT_ROUNDS = 10
+MAX_BCRYPT_ROUNDS = 16
+
+
+def measure_bcrypt_ms(rounds: int, samples: int = 3) -> float:
+    """Best-of-N wall time of one bcrypt hash at this cost"""
+    salt = bcrypt.gensalt(rounds)
+    best = float("inf")
+    for _ in range(samples):
+        started = time.perf_counter()
+        bcrypt.hashpw(b"calibration-password", salt)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def calibrate_bcrypt_rounds(target_ms: float, min_rounds: int = MIN_BCRYPT_ROUNDS,
+                            max_rounds: int = MAX_BCRYPT_ROUNDS) -> Tuple[int, float]:
+    """(rounds, measured ms) of the highest cost that hashes within target_ms
+
+    Each extra round doubles the work, so one measurement at min_rounds is
+    extrapolated and the pick is then confirmed with a real measurement.
+    Never goes below min_rounds, even if the host is too slow for the target.
+    """
+    base_ms = measure_bcrypt_ms(min_rounds)
+    rounds = min_rounds
+    while rounds < max_rounds and base_ms * 2 ** (rounds + 1 - min_rounds) <= target_ms:
+        rounds += 1
+
+    measured_ms = measure_bcrypt_ms(rounds) if rounds != min_rounds else base_ms
+    while rounds > min_rounds and measured_ms > target_ms:
+        rounds -= 1
+        measured_ms = measure_bcrypt_ms(rounds)
+    return rounds, measured_ms
+
+
+class HasherOverloaded(Exception):
+    """Raised when the hashing queue is full"""
+
+
+class PasswordHasher:
+    """Async front-end for a passlib CryptContext"""
+
+    def __init__(self, context, max_workers: int = 2, max_queue: int = 64):
+        self.context = context
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.rounds: Optional[int] = None
+        self.rehashed = 0
+        self._slots = asyncio.Semaphore(max_workers)
+        self._waiting = 0
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._work_total = 0.0
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _submit(self, fn, *args):
+        if self._waiting >= self.max_queue:
+            self.rejected += 1
+            raise HasherOverloaded(f"{self._waiting} password hashes already queued")
+
+        # Queue on the event loop, so the executor never holds more than max_workers calls
+        enqueued_at = time.perf_counter()
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        wait_time = time.perf_counter() - enqueued_at
+
+        self._running += 1
+        try:
+            started_at = time.perf_counter()
+            result = await asyncio.get_running_loop().run_in_executor(self._pool(), fn, *args)
+            work_time = time.perf_counter() - started_at
+        finally:
+            self._running -= 1
+            self._slots.release()
+
+        self.completed += 1
+        self._wait_total += wait_time
+        self._wait_max = max(self._wait_max, wait_time)
+        self._work_total += work_time
+        return result
+
+    def set_rounds(self, rounds: int, exact: bool = True):
+        """Hash with this bcrypt cost from now on
+
+        Hashes below it are rehashed on login; with exact=True so are hashes
+        above it (a deliberate downgrade). Calibrated costs are not exact:
+        hosts of different speed would otherwise rehash the same users back
+        and forth.
+        """
+        settings = {"bcrypt__default_rounds": rounds, "bcrypt__min_rounds": rounds}
+        if exact:
+            settings["bcrypt__max_rounds"] = rounds
+        self.context.update(**settings)
+        self.rounds = rounds
+
+    async def calibrate(self, target_ms: float) -> Tuple[int, float]:
+        """Measure on this host (in the pool) and adopt the fitting cost"""
+        rounds, measured_ms = await asyncio.get_running_loop().run_in_executor(
+            self._pool(), calibrate_bcrypt_rounds, target_ms
+        )
+        self.set_rounds(rounds, exact=False)
+        return rounds, measured_ms
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(self.context.hash, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self._submit(self.context.verify, password, password_hash)
+
+    async def verify_and_update(self, password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+        """(valid, new hash or None): a new hash is returned when the stored
+        one uses an outdated scheme or cost"""
+        valid, new_hash = await self._submit(self.context.verify_and_update, password, password_hash)
+        if new_hash is not None:
+            self.rehashed += 1
+        return valid, new_hash
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "bcrypt_rounds": self.rounds,
+            "rehashed": self.rehashed,
+            "queue_depth": self._waiting,
+            "running": self._running,
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": self._wait_total / self.completed * 1000 if self.completed else 0.0,
+            "max_wait_ms": self._wait_max * 1000,
+            "avg_hash_ms": self._work_total / self.completed * 1000 if self.completed else 0.0,
+        }
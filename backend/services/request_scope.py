@@ -0,0 +1,111 @@
+"""
+Per-request Scope and DB Round-trip Instrumentation
+Miluv.app
+
+RequestScopeMiddleware gives every HTTP request its own scope (request-local
+DataLoaders plus a MongoDB command counter) through a ContextVar. Motor runs
+pymongo on an executor with a copy of the caller's context, so the command
+listener can attribute each round trip to the request that issued it.
+"""
+
+import threading
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+from pymongo import monitoring
+
+from services.dataloader import DataLoader
+
+
+class RequestScope:
+    """State that lives exactly as long as one request"""
+
+    def __init__(self):
+        self.loaders: Dict[str, DataLoader] = {}
+        self.db_round_trips = 0
+        self._lock = threading.Lock()
+
+    def loader(self, name: str, factory: Callable[[], DataLoader]) -> DataLoader:
+        loader = self.loaders.get(name)
+        if loader is None:
+            loader = self.loaders[name] = factory()
+        return loader
+
+    def count_round_trip(self):
+        with self._lock:
+            self.db_round_trips += 1
+
+
+_current_scope: ContextVar[Optional[RequestScope]] = ContextVar("request_scope", default=None)
+
+
+def current_scope() -> RequestScope:
+    """Scope of the running request; outside a request a throwaway scope"""
+    scope = _current_scope.get()
+    return scope if scope is not None else RequestScope()
+
+
+class DBRoundTripListener(monitoring.CommandListener):
+    """Counts every command (find, getMore, insert, ...) against the current request"""
+
+    def started(self, event):
+        scope = _current_scope.get()
+        if scope is not None:
+            scope.count_round_trip()
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class RoundTripStats:
+    """Aggregated round trips per route"""
+
+    def __init__(self):
+        self.routes: Dict[str, dict] = {}
+
+    def record(self, route: str, round_trips: int):
+        stats = self.routes.setdefault(route, {"requests": 0, "round_trips": 0, "max": 0})
+        stats["requests"] += 1
+        stats["round_trips"] += round_trips
+        stats["max"] = max(stats["max"], round_trips)
+
+    def snapshot(self) -> Dict[str, dict]:
+        return {
+            route: {**stats, "avg": stats["round_trips"] / stats["requests"]}
+            for route, stats in self.routes.items()
+        }
+
+
+round_trip_stats = RoundTripStats()
+
+
+class RequestScopeMiddleware:
+    """ASGI middleware: opens a RequestScope per HTTP request and reports its
+    DB round trips in the X-DB-Round-Trips response header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_scope = RequestScope()
+        token = _current_scope.set(request_scope)
+
+        async def send_with_header(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-round-trips", str(request_scope.db_round_trips).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_header)
+        finally:
+            _current_scope.reset(token)
+            route = scope.get("route")
+            round_trip_stats.record(getattr(route, "path", "<unmatched>"), request_scope.db_round_trips)
@@ -0,0 +1,180 @@
+"""
+Per-user "Seen" Filters
+Miluv.app
+
+A Bloom filter per user over the ids of everyone they have swiped on (liked
+or passed), so discover can drop already-seen candidates with an O(1)
+membership test instead of loading the full like/pass history.
+
+Filters are persisted in `seen_filters` as an array of 64-bit words. Adds
+are applied with `$bit: {or: ...}` on just the touched words, so several
+server processes can record swipes concurrently without losing bits. Loaded
+filters are kept in a bounded LRU; a short TTL picks up swipes recorded by
+other processes.
+
+Bit positions depend on the capacity, so every `$bit` update is conditional
+on the capacity it was computed for; if another process has rebuilt the
+filter at a new size the cached copy is dropped and the add retried. Swipes
+are written to likes/passes before they reach the filter, so a rebuild
+re-reads them after replacing the document to restore bits a concurrent
+`$bit` had set on the old one.
+
+False positives (default 1%) hide a small fraction of unseen candidates;
+false negatives cannot happen. When a user swipes past the filter's
+capacity it is rebuilt at twice the size from `likes` and `passes`.
+"""
+
+import hashlib
+import math
+from typing import Iterable, List, Optional
+
+from bson.int64 import Int64
+
+from services.ttl_cache import TTLCache
+
+DEFAULT_CAPACITY = 1000
+DEFAULT_ERROR_RATE = 0.01
+WORD_BITS = 64
+
+
+def _to_int64(word: int) -> Int64:
+    """Unsigned 64-bit word as the signed Int64 MongoDB stores"""
+    return Int64(word - (1 << 64) if word >= (1 << 63) else word)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter backed by a list of 64-bit words"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, error_rate: float = DEFAULT_ERROR_RATE,
+                 words: Optional[List[int]] = None, count: int = 0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        num_bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        self.num_words = math.ceil(num_bits / WORD_BITS)
+        self.num_bits = self.num_words * WORD_BITS
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.words = [word & ((1 << 64) - 1) for word in words] if words else [0] * self.num_words
+        self.count = count
+
+    def _positions(self, key: str) -> List[int]:
+        # Double hashing (Kirsch-Mitzenmacher): k positions from two 64-bit hashes
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.words[p // WORD_BITS] >> (p % WORD_BITS) & 1 for p in self._positions(key))
+
+    def add(self, key: str) -> dict:
+        """Set the key's bits; returns {word index: mask} of the bits it set"""
+        masks = {}
+        for p in self._positions(key):
+            masks[p // WORD_BITS] = masks.get(p // WORD_BITS, 0) | (1 << (p % WORD_BITS))
+        for index, mask in masks.items():
+            self.words[index] |= mask
+        self.count += 1
+        return masks
+
+    @property
+    def full(self) -> bool:
+        return self.count > self.capacity
+
+    def to_document(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "error_rate": self.error_rate,
+            "words": [_to_int64(word) for word in self.words],
+            "count": self.count
+        }
+
+    @classmethod
+    def from_document(cls, doc: dict) -> "BloomFilter":
+        return cls(doc["capacity"], doc["error_rate"], doc["words"], doc["count"])
+
+
+class SeenStore:
+    """Loads, caches and updates every user's seen filter"""
+
+    def __init__(self, db, cache_size: int = 10000, cache_ttl: float = 60,
+                 capacity: int = DEFAULT_CAPACITY, error_rate: float = DEFAULT_ERROR_RATE):
+        self.db = db
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+
+    async def get(self, user_id: str) -> BloomFilter:
+        seen = self._cache.get(user_id)
+        if seen is None:
+            doc = await self.db.seen_filters.find_one({"_id": user_id})
+            seen = BloomFilter.from_document(doc) if doc else await self.rebuild(user_id)
+            self._cache.set(user_id, seen)
+        return seen
+
+    async def add(self, user_id: str, target_ids: Iterable[str]):
+        """Record swipes on target_ids (already written to likes/passes)"""
+        target_ids = list(target_ids)
+        if not target_ids:
+            return
+        for _ in range(2):
+            seen = await self.get(user_id)
+            masks = {}
+            for target_id in target_ids:
+                for index, mask in seen.add(target_id).items():
+                    masks[index] = masks.get(index, 0) | mask
+
+            if seen.full:
+                # Swipes are already in likes/passes, the rebuild picks them up
+                await self.rebuild(user_id, capacity=seen.capacity * 2)
+                return
+            if await self._merge(user_id, seen.capacity, masks, len(target_ids)):
+                return
+            # Rebuilt at another capacity by another process: our bit positions are wrong
+            self._cache.pop(user_id)
+        await self.rebuild(user_id)
+
+    async def _merge(self, user_id: str, capacity: int, masks: dict, count: int) -> bool:
+        """OR masks into the persisted filter if it still has `capacity`"""
+        result = await self.db.seen_filters.update_one(
+            {"_id": user_id, "capacity": capacity},
+            {
+                "$bit": {f"words.{index}": {"or": _to_int64(mask)} for index, mask in masks.items()},
+                "$inc": {"count": count}
+            }
+        )
+        return result.matched_count > 0
+
+    async def _swiped(self, user_id: str) -> set:
+        swiped = set()
+        for collection in (self.db.likes, self.db.passes):
+            async for swipe in collection.find({"from_user_id": user_id}, {"to_user_id": 1, "_id": 0}):
+                swiped.add(swipe["to_user_id"])
+        return swiped
+
+    async def rebuild(self, user_id: str, capacity: Optional[int] = None) -> BloomFilter:
+        """Build a user's filter from their full like/pass history and persist it"""
+        swiped = await self._swiped(user_id)
+        capacity = capacity or self.capacity
+        while len(swiped) > capacity:
+            capacity *= 2
+        seen = BloomFilter(capacity, self.error_rate)
+        for target_id in swiped:
+            seen.add(target_id)
+        await self.db.seen_filters.replace_one({"_id": user_id}, seen.to_document(), upsert=True)
+
+        # A $bit another process applied between our read and the replace was
+        # overwritten; its swipe was stored first, so a second read finds it
+        missed = [target_id for target_id in await self._swiped(user_id) if target_id not in seen]
+        if missed:
+            masks = {}
+            for target_id in missed:
+                for index, mask in seen.add(target_id).items():
+                    masks[index] = masks.get(index, 0) | mask
+            # No match: rebuilt again meanwhile, and that rebuild re-reads too
+            await self._merge(user_id, seen.capacity, masks, len(missed))
+
+        self._cache.set(user_id, seen)
+        return seen
+
+    def stats(self) -> dict:
+        return self._cache.stats()
@@ -0,0 +1,328 @@
+"""
+Socket.IO Cluster Managers
+Miluv.app
+
+python-socketio keeps connected sids and rooms per process. To run chat on
+more than one worker or node, the AsyncServer gets a pub/sub client manager:
+an emit to a room is published on a shared channel and every process
+delivers it to the members connected to it.
+
+Backends (SOCKET_MANAGER):
+  local   single process, socketio's default manager (no pub/sub)
+  memory  bus shared by every server in this process; for tests
+  broker  line-delimited JSON over TCP to start_broker(); a local stand-in
+          for Redis, used by benchmarks/socket_cluster_harness.py
+  redis   socketio.AsyncRedisManager (needs the redis package)
+  mongo   change stream on the `socket_events` collection (needs a replica set)
+
+Presence is replicated over the same channel: each process announces users
+going online/offline and re-announces its full set every PRESENCE_INTERVAL
+seconds, so any process answers "is X online" from memory. A process not
+heard from for PRESENCE_EXPIRY seconds is forgotten.
+"""
+
+import abc
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+from engineio import json
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_INTERVAL = 10  # seconds
+PRESENCE_EXPIRY = 3 * PRESENCE_INTERVAL
+
+
+class ClusterPresence:
+    """Online users of this process plus the last known set of every other one"""
+
+    def __init__(self, host_id: str = "local", publish=None, expiry: float = PRESENCE_EXPIRY):
+        self.host_id = host_id
+        self._publish = publish
+        self.expiry = expiry
+        self._local: Dict[str, int] = {}  # user_id -> open connections here
+        self._remote: Dict[str, Tuple[Set[str], float]] = {}  # host_id -> (users, last heard)
+
+    async def connected(self, user_id: str):
+        count = self._local.get(user_id, 0)
+        self._local[user_id] = count + 1
+        if count == 0:
+            await self._announce("online", [user_id])
+
+    async def disconnected(self, user_id: str):
+        count = self._local.get(user_id, 0)
+        if count > 1:
+            self._local[user_id] = count - 1
+        elif count == 1:
+            del self._local[user_id]
+            await self._announce("offline", [user_id])
+
+    def is_online(self, user_id: str) -> bool:
+        if user_id in self._local:
+            return True
+        now = time.monotonic()
+        return any(
+            user_id in users
+            for users, heard_at in self._remote.values()
+            if now - heard_at < self.expiry
+        )
+
+    def online_users(self) -> Set[str]:
+        now = time.monotonic()
+        users = set(self._local)
+        for remote_users, heard_at in self._remote.values():
+            if now - heard_at < self.expiry:
+                users |= remote_users
+        return users
+
+    async def announce_snapshot(self):
+        await self._announce("snapshot", list(self._local))
+
+    async def request_sync(self):
+        """Ask every other process to announce its snapshot now"""
+        await self._announce("sync", [])
+
+    def handle(self, message: dict) -> bool:
+        """Apply a presence message from another process; True if it asks
+        for our snapshot"""
+        host_id = message.get("host_id")
+        if host_id == self.host_id:
+            return False
+        change = message.get("change")
+        users, _ = self._remote.get(host_id, (set(), 0.0))
+        if change == "snapshot":
+            users = set(message.get("users", []))
+        elif change == "online":
+            users = users | set(message.get("users", []))
+        elif change == "offline":
+            users = users - set(message.get("users", []))
+        self._remote[host_id] = (users, time.monotonic())
+        return change == "sync"
+
+    async def _announce(self, change: str, users: List[str]):
+        if self._publish is None:
+            return
+        try:
+            await self._publish({"method": "presence", "host_id": self.host_id,
+                                 "change": change, "users": users})
+        except Exception as e:
+            # Presence is best effort; the next snapshot repairs a lost update
+            logger.warning(f"Presence announce failed: {e}")
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "local_users": len(self._local),
+            "hosts": 1 + sum(1 for _, heard_at in self._remote.values() if now - heard_at < self.expiry),
+            "online_users": len(self.online_users()),
+        }
+
+
+class ClusterManagerMixin(metaclass=abc.ABCMeta):
+    """Replicated presence for an AsyncPubSubManager backend
+
+    Backends implement _receive() (raw messages from the channel) instead of
+    _listen(); presence messages are consumed here and never reach socketio.
+    """
+
+    def __init__(self, *args, presence_interval: float = PRESENCE_INTERVAL, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.presence_interval = presence_interval
+        self.presence = ClusterPresence(self.host_id, self._publish, expiry=3 * presence_interval)
+
+    def initialize(self):
+        super().initialize()
+        if not self.write_only:
+            self.server.start_background_task(self._presence_loop)
+
+    async def _presence_loop(self):
+        await self.presence.request_sync()
+        while True:
+            await self.presence.announce_snapshot()
+            await asyncio.sleep(self.presence_interval)
+
+    async def _listen(self):
+        async for message in self._receive():
+            data = message
+            if not isinstance(data, dict):
+                try:
+                    data = json.loads(message)
+                except ValueError:
+                    continue
+            if data.get("method") == "presence":
+                if self.presence.handle(data):
+                    await self.presence.announce_snapshot()
+                continue
+            yield data
+
+    @abc.abstractmethod
+    def _receive(self):
+        """Async iterator over raw channel messages (str, bytes or dict)"""
+
+
+class MemoryManager(ClusterManagerMixin, AsyncPubSubManager):
+    """Pub/sub between servers living in the same process (tests)"""
+
+    name = "memory"
+    _subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    async def _publish(self, data):
+        # Serialized like a real backend would, so nothing is shared by reference
+        payload = json.dumps(data)
+        for queue in self._subscribers.get(self.channel, []):
+            queue.put_nowait(payload)
+
+    async def _receive(self):
+        queue = asyncio.Queue()
+        self._subscribers.setdefault(self.channel, []).append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers[self.channel].remove(queue)
+
+
+async def start_broker(host: str = "127.0.0.1", port: int = 0) -> asyncio.AbstractServer:
+    """Tiny fan-out broker for BrokerManager: every line received is written
+    to every connection, sender included"""
+    writers: Set[asyncio.StreamWriter] = set()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for peer in list(writers):
+                    try:
+                        peer.write(line)
+                        await peer.drain()
+                    except ConnectionError:
+                        writers.discard(peer)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writers.discard(writer)
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+class BrokerManager(ClusterManagerMixin, AsyncPubSubManager):
+    """Pub/sub through start_broker(), at tcp://host:port"""
+
+    name = "broker"
+
+    def __init__(self, url: str = "tcp://127.0.0.1:6390", channel: str = "socketio",
+                 write_only: bool = False, logger=None, **kwargs):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, **kwargs)
+        parsed = urlparse(url)
+        self.broker_host = parsed.hostname or "127.0.0.1"
+        self.broker_port = parsed.port or 6390
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._write_lock = asyncio.Lock()
+
+    async def _publish(self, data):
+        line = f"{self.channel}\t{json.dumps(data)}\n".encode()
+        async with self._write_lock:
+            for retry in (False, True):
+                try:
+                    if self._writer is None or self._writer.is_closing():
+                        _, self._writer = await asyncio.open_connection(self.broker_host, self.broker_port)
+                    self._writer.write(line)
+                    await self._writer.drain()
+                    return
+                except ConnectionError:
+                    self._writer = None
+                    if retry:
+                        raise
+
+    async def _receive(self):
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.broker_host, self.broker_port)
+            except OSError as e:
+                self._get_logger().error(f"Cannot reach socket broker: {e}; retrying")
+                await asyncio.sleep(1)
+                continue
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    channel, _, payload = line.decode().rstrip("\n").partition("\t")
+                    if channel == self.channel:
+                        yield payload
+            finally:
+                writer.close()
+            self._get_logger().error("Socket broker connection lost; reconnecting")
+            await asyncio.sleep(1)
+
+
+class RedisManager(ClusterManagerMixin, socketio.AsyncRedisManager):
+    """socketio.AsyncRedisManager with replicated presence"""
+
+    def _receive(self):
+        return socketio.AsyncRedisManager._listen(self)
+
+
+class MongoManager(ClusterManagerMixin, AsyncPubSubManager):
+    """Pub/sub through inserts into a collection, read back with a change
+    stream; a TTL index on created_at keeps the collection small"""
+
+    name = "mongo"
+
+    def __init__(self, db, collection: str = "socket_events", channel: str = "socketio",
+                 write_only: bool = False, logger=None, **kwargs):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, **kwargs)
+        self.collection = db[collection]
+
+    async def _publish(self, data):
+        await self.collection.insert_one({
+            "channel": self.channel,
+            "data": json.dumps(data),
+            "created_at": datetime.utcnow()
+        })
+
+    async def _receive(self):
+        pipeline = [{"$match": {"operationType": "insert", "fullDocument.channel": self.channel}}]
+        resume_after = None
+        while True:
+            try:
+                async with self.collection.watch(pipeline, resume_after=resume_after) as stream:
+                    async for change in stream:
+                        resume_after = stream.resume_token
+                        yield change["fullDocument"]["data"]
+            except PyMongoError as e:
+                self._get_logger().error(f"Socket change stream failed: {e}; resuming")
+                await asyncio.sleep(1)
+
+
+def create_client_manager(backend: Optional[str] = None, db=None):
+    """Client manager for SOCKET_MANAGER; None means socketio's in-process default"""
+    backend = (backend or os.getenv("SOCKET_MANAGER", "local")).lower()
+    channel = os.getenv("SOCKET_CHANNEL", "miluv-socketio")
+
+    if backend == "local":
+        return None
+    if backend == "memory":
+        return MemoryManager(channel=channel)
+    if backend == "broker":
+        return BrokerManager(os.getenv("SOCKET_BROKER_URL", "tcp://127.0.0.1:6390"), channel=channel)
+    if backend == "redis":
+        return RedisManager(os.getenv("SOCKET_REDIS_URL", "redis://localhost:6379/0"), channel=channel)
+    if backend == "mongo":
+        if db is None:
+            from motor.motor_asyncio import AsyncIOMotorClient
+            db = AsyncIOMotorClient(os.environ["MONGO_URL"])[os.environ["DB_NAME"]]
+        return MongoManager(db, channel=channel)
+    raise ValueError(f"Unknown SOCKET_MANAGER: {backend}")
@@ -1,6 +1,14 @@
 """
 Socket.IO Service untuk Real-time Chat
 Miluv.app
+
+Multi-process: set SOCKET_MANAGER (see services/socket_cluster.py) so room
+emits and presence are shared between workers. Every connection joins its
+user's room, user_room(user_id), so per-user emits reach whichever worker
+the user is connected to.
+
+A user may be connected from several devices at once; `connections` tracks
+sid -> user, user -> sids and sid -> rooms so disconnects never scan.
 """
 
 import socketio
@@ -8,21 +16,43 @@ import os
 from typing import Dict, Set
 from dotenv import load_dotenv
 
+from services.connection_index import ConnectionIndex
+from services.socket_cluster import ClusterPresence, create_client_manager
+
 load_dotenv()
 
+client_manager = create_client_manager()
+
 # Create Socket.IO server
 sio = socketio.AsyncServer(
     async_mode='asgi',
+    client_manager=client_manager,
     cors_allowed_origins=os.getenv('SOCKET_CORS_ORIGINS', '*'),
     logger=True,
     engineio_logger=False
 )
 
-# Store active connections: {user_id: sid}
-active_users: Dict[str, str] = {}
+# Online users across all workers (only this one with the local manager)
+presence: ClusterPresence = client_manager.presence if client_manager is not None else ClusterPresence()
 
-# Store user rooms (match_id): {match_id: Set[user_id]}
-match_rooms: Dict[str, Set[str]] = {}
+# Connections and chat rooms (match_id) on this worker
+connections = ConnectionIndex()
+
+
+def user_room(user_id: str) -> str:
+    """Room joined by every connection of a user"""
+    return f"user:{user_id}"
+
+
+def start_client_manager():
+    """
+    Start listening on the pub/sub channel now instead of at the first
+    connection, so a worker without sockets still tracks presence.
+    Call once from the app's startup, with the event loop running.
+    """
+    if not sio.manager_initialized:
+        sio.manager_initialized = True
+        sio.manager.initialize()
 
 
 @sio.event
@@ -37,7 +67,9 @@ async def connect(sid, environ, auth):
     user_id = auth.get('user_id') if auth else None
     
     if user_id:
-        active_users[user_id] = sid
+        connections.connect(sid, user_id)
+        await sio.enter_room(sid, user_room(user_id))
+        await presence.connected(user_id)
         print(f"User {user_id} connected with sid {sid}")
         
         # Emit connection success
@@ -49,21 +81,12 @@ async def connect(sid, environ, auth):
 @sio.event
 async def disconnect(sid):
     """Handle client disconnect"""
-    # Remove from active users
-    user_id = None
-    for uid, user_sid in active_users.items():
-        if user_sid == sid:
-            user_id = uid
-            break
+    # Remove from active users and from the rooms this sid joined
+    user_id, last_device, _ = connections.disconnect(sid)
     
     if user_id:
-        del active_users[user_id]
-        print(f"User {user_id} disconnected")
-        
-        # Remove from all rooms
-        for match_id, users in match_rooms.items():
-            if user_id in users:
-                users.remove(user_id)
+        await presence.disconnected(user_id)
+        print(f"User {user_id} disconnected ({'offline' if last_device else 'other devices still connected'})")
 
 
 @sio.event
@@ -75,7 +98,7 @@ async def join_chat(sid, data):
         "match_id": str
     }
     """
-    user_id = data.get('user_id')
+    user_id = connections.user(sid) or data.get('user_id')
     match_id = data.get('match_id')
     
     if not user_id or not match_id:
@@ -85,20 +108,18 @@ async def join_chat(sid, data):
     # Add to room
     await sio.enter_room(sid, match_id)
     
-    # Track in match_rooms
-    if match_id not in match_rooms:
-        match_rooms[match_id] = set()
-    match_rooms[match_id].add(user_id)
+    first_device = connections.join(sid, match_id, user_id)
     
     print(f"User {user_id} joined chat {match_id}")
     
-    # Notify others in room
-    await sio.emit(
-        'user_joined',
-        {'user_id': user_id, 'match_id': match_id},
-        room=match_id,
-        skip_sid=sid
-    )
+    # Notify others in room, once per user (not per device)
+    if first_device:
+        await sio.emit(
+            'user_joined',
+            {'user_id': user_id, 'match_id': match_id},
+            room=match_id,
+            skip_sid=sid
+        )
 
 
 @sio.event
@@ -110,7 +131,7 @@ async def leave_chat(sid, data):
         "match_id": str
     }
     """
-    user_id = data.get('user_id')
+    user_id = connections.user(sid) or data.get('user_id')
     match_id = data.get('match_id')
     
     if not user_id or not match_id:
@@ -119,18 +140,17 @@ async def leave_chat(sid, data):
     # Remove from room
     await sio.leave_room(sid, match_id)
     
-    # Remove from match_rooms
-    if match_id in match_rooms and user_id in match_rooms[match_id]:
-        match_rooms[match_id].remove(user_id)
+    left = connections.leave(sid, match_id)
     
     print(f"User {user_id} left chat {match_id}")
     
-    # Notify others
-    await sio.emit(
-        'user_left',
-        {'user_id': user_id, 'match_id': match_id},
-        room=match_id
-    )
+    # Notify others once the user's last device has left
+    if left:
+        await sio.emit(
+            'user_left',
+            {'user_id': user_id, 'match_id': match_id},
+            room=match_id
+        )
 
 
 @sio.event
@@ -238,20 +258,14 @@ async def message_read(sid, data):
 
 async def notify_new_match(user_a_id: str, user_b_id: str, match_id: str):
     """
-    Notify both users tentang match baru
+    Notify both users tentang match baru, di worker mana pun mereka terhubung
     """
     match_data = {
         'match_id': match_id,
         'message': "It's a match!"
     }
     
-    # Notify user A
-    if user_a_id in active_users:
-        await sio.emit('new_match', match_data, room=active_users[user_a_id])
-    
-    # Notify user B
-    if user_b_id in active_users:
-        await sio.emit('new_match', match_data, room=active_users[user_b_id])
+    await sio.emit('new_match', match_data, room=[user_room(user_a_id), user_room(user_b_id)])
 
 
 async def notify_message_saved(match_id: str, message_data: Dict):
@@ -261,16 +275,16 @@ async def notify_message_saved(match_id: str, message_data: Dict):
     await sio.emit('message_saved', message_data, room=match_id)
 
 
-def get_active_users() -> Dict[str, str]:
-    """Get dictionary of active users"""
-    return active_users.copy()
+def get_active_users() -> Dict[str, Set[str]]:
+    """Get dictionary of active users on this worker: {user_id: sids}"""
+    return connections.users()
 
 
 def get_user_status(user_id: str) -> bool:
-    """Check if user is online"""
-    return user_id in active_users
+    """Check if user is online on any worker"""
+    return presence.is_online(user_id)
 
 
 def get_room_users(match_id: str) -> Set[str]:
-    """Get users in a chat room"""
-    return match_rooms.get(match_id, set()).copy()
+    """Get users in a chat room on this worker"""
+    return connections.room_users(match_id)
@@ -0,0 +1,81 @@
+"""
+User Data Access Layer
+Miluv.app
+
+Every read of the `users` collection goes through a named view, so each
+endpoint only pulls the fields it actually returns. Base64 photo arrays and
+password hashes never leave MongoDB unless a view asks for them.
+"""
+
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+
+from services.auth_tokens import TOKEN_CLAIM_FIELDS
+
+# Per-endpoint projection specs
+USER_VIEWS: Dict[str, Dict[str, Any]] = {
+    # get_current_user: everything except blobs and secrets
+    "current_user": {"profile_photos": 0, "selfie_photo": 0, "password_hash": 0},
+    # register: uniqueness checks
+    "exists": {"_id": 1},
+    # login: hash plus everything an access token carries
+    "credentials": {"password_hash": 1, "profile_photos": 1, **{field: 1 for field in TOKEN_CLAIM_FIELDS}},
+    # token refresh
+    "token_claims": {"profile_photos": 1, **{field: 1 for field in TOKEN_CLAIM_FIELDS}},
+    # verify_face: only the first profile photo is compared ($slice alone
+    # would make this an exclusion projection returning the whole document)
+    "face_source": {"verified_face": 1, "profile_photos": {"$slice": 1}},
+    # submit_assessment: completion check
+    "assessment_progress": {"mbti": 1, "love_language": 1, "readiness": 1, "temperament": 1, "disc": 1},
+    # get_profile: current user record already cached, only photos missing
+    "own_photos": {"profile_photos": 1},
+    # get_matches / get_feeds list rows
+    "list_row": {"name": 1, "profile_photos": {"$slice": 1}},
+    # discover cards
+    "discover_card": {
+        "name": 1, "date_of_birth": 1, "gender": 1, "profile_photos": 1, "bio": 1,
+        "mbti": 1, "love_language": 1, "temperament": 1, "disc": 1, "verified_face": 1
+    },
+    # discover ranking (no photos)
+    "ranking": {
+        "mbti": 1, "love_language": 1, "readiness": 1, "temperament": 1, "disc": 1, "trait_codes": 1
+    },
+    # create_feed fan-out: read fresh, the cached current user may predate a match
+    "feed_audience": {"matched_user_ids": 1},
+    # geo index bootstrap
+    "coordinates": {"latitude": 1, "longitude": 1},
+    # get_user_profile
+    "public_profile": {
+        "name": 1, "username": 1, "date_of_birth": 1, "gender": 1, "profile_photos": 1, "bio": 1,
+        "verified_face": 1, "mbti": 1, "love_language": 1, "temperament": 1, "disc": 1
+    },
+}
+
+
+class UserRepository:
+    """Thin wrapper over db.users that requires a view for every read"""
+
+    def __init__(self, db):
+        self.collection = db.users
+
+    @staticmethod
+    def projection(view: str) -> Dict[str, Any]:
+        try:
+            return USER_VIEWS[view]
+        except KeyError:
+            raise ValueError(f"Unknown user view: {view}")
+
+    async def get(self, user_id: str, view: str) -> Optional[dict]:
+        return await self.collection.find_one({"_id": ObjectId(user_id)}, self.projection(view))
+
+    async def find_one(self, query: dict, view: str) -> Optional[dict]:
+        return await self.collection.find_one(query, self.projection(view))
+
+    def find(self, query: dict, view: str):
+        return self.collection.find(query, self.projection(view))
+
+    async def get_many(self, user_ids: List[ObjectId], view: str) -> Dict[ObjectId, dict]:
+        """{_id: user} for all ids in one $in query"""
+        users = await self.find({"_id": {"$in": list(user_ids)}}, view).to_list(None)
+        return {user["_id"]: user for user in users}
@@ -10,12 +10,15 @@ import {
 } from 'react-native';
 import { useRouter } from 'expo-router';
 import { Ionicons } from '@expo/vector-icons';
-import { discoveryAPI } from '../../services/api';
+import { discoveryAPI, imageUri } from '../../services/api';
 import { format } from 'date-fns';
 
 export default function ChatScreen() {
   const [matches, setMatches] = useState<any[]>([]);
   const [loading, setLoading] = useState(true);
+  const [page, setPage] = useState(1);
+  const [hasMore, setHasMore] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
   const router = useRouter();
 
   useEffect(() => {
@@ -25,8 +28,10 @@ export default function ChatScreen() {
   const loadMatches = async () => {
     setLoading(true);
     try {
-      const response = await discoveryAPI.getMatches();
+      const response = await discoveryAPI.getMatches(1);
       setMatches(response.data.matches);
+      setPage(1);
+      setHasMore(response.data.has_more);
     } catch (error) {
       console.error('Load matches error:', error);
     } finally {
@@ -34,6 +39,26 @@ export default function ChatScreen() {
     }
   };
 
+  // Matches come in pages of 50, most recent chat activity first
+  const loadMoreMatches = async () => {
+    if (!hasMore || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const response = await discoveryAPI.getMatches(page + 1);
+      // A chat that got new activity meanwhile moves up and may repeat
+      setMatches((current) => {
+        const seen = new Set(current.map((match) => match.match_id));
+        return [...current, ...response.data.matches.filter((match: any) => !seen.has(match.match_id))];
+      });
+      setPage(page + 1);
+      setHasMore(response.data.has_more);
+    } catch (error) {
+      console.error('Load more matches error:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const renderMatch = ({ item }: { item: any }) => (
     <TouchableOpacity
       style={styles.matchItem}
@@ -43,7 +68,7 @@ export default function ChatScreen() {
       }}
     >
       <Image
-        source={{ uri: `data:image/jpeg;base64,${item.user.profile_photo}` }}
+        source={{ uri: imageUri(item.user.profile_photo) }}
         style={styles.avatar}
       />
       <View style={styles.matchInfo}>
@@ -84,6 +109,9 @@ export default function ChatScreen() {
           renderItem={renderMatch}
           keyExtractor={(item) => item.match_id}
           contentContainerStyle={styles.list}
+          onEndReached={loadMoreMatches}
+          onEndReachedThreshold={0.5}
+          ListFooterComponent={loadingMore ? <ActivityIndicator color="#FF6B9D" /> : null}
         />
       )}
     </View>
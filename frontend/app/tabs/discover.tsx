@@ -10,7 +10,7 @@ import {
   Dimensions,
 } from 'react-native';
 import { Ionicons } from '@expo/vector-icons';
-import { discoveryAPI } from '../../services/api';
+import { discoveryAPI, imageUri } from '../../services/api';
 import { useAuth } from '../../contexts/AuthContext';
 
 const { width, height } = Dimensions.get('window');
@@ -67,6 +67,10 @@ export default function DiscoverScreen() {
   };
 
   const handlePass = () => {
+    if (currentIndex >= users.length) return;
+
+    // Fire and forget: a failed pass only means the user may show up again
+    discoveryAPI.passUser(users[currentIndex].id).catch(() => {});
     nextUser();
   };
 
@@ -114,7 +118,7 @@ export default function DiscoverScreen() {
 
       <View style={styles.cardContainer}>
         <Image
-          source={{ uri: `data:image/jpeg;base64,${currentUser.profile_photos[0]}` }}
+          source={{ uri: imageUri(currentUser.profile_photos[0]) }}
           style={styles.cardImage}
         />
         <View style={styles.cardInfo}>
@@ -14,7 +14,7 @@ import {
   Platform,
 } from 'react-native';
 import { Ionicons } from '@expo/vector-icons';
-import { feedAPI } from '../../services/api';
+import { feedAPI, imageUri } from '../../services/api';
 import { useAuth } from '../../contexts/AuthContext';
 import * as ImagePicker from 'expo-image-picker';
 
@@ -89,7 +89,7 @@ export default function FeedsScreen() {
       <View style={styles.feedHeader}>
         {item.user.profile_photo ? (
           <Image
-            source={{ uri: `data:image/jpeg;base64,${item.user.profile_photo}` }}
+            source={{ uri: imageUri(item.user.profile_photo) }}
             style={styles.avatar}
           />
         ) : (
@@ -107,7 +107,7 @@ export default function FeedsScreen() {
 
       {item.images && item.images.length > 0 && (
         <Image
-          source={{ uri: `data:image/jpeg;base64,${item.images[0]}` }}
+          source={{ uri: imageUri(item.images[0]) }}
           style={styles.feedImage}
         />
       )}
@@ -11,7 +11,7 @@ import {
 } from 'react-native';
 import { useRouter } from 'expo-router';
 import { Ionicons } from '@expo/vector-icons';
-import { profileAPI } from '../../services/api';
+import { profileAPI, imageUri } from '../../services/api';
 import { useAuth } from '../../contexts/AuthContext';
 
 export default function ProfileScreen() {
@@ -83,7 +83,7 @@ export default function ProfileScreen() {
         <View style={styles.photoContainer}>
           {profile.profile_photos && profile.profile_photos.length > 0 ? (
             <Image
-              source={{ uri: `data:image/jpeg;base64,${profile.profile_photos[0]}` }}
+              source={{ uri: imageUri(profile.profile_photos[0]) }}
               style={styles.profilePhoto}
             />
           ) : (
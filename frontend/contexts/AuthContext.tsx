@@ -61,9 +61,10 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
   const login = async (email: string, password: string) => {
     try {
       const response = await authAPI.login({ email, password });
-      const { token: newToken, user_id, verified_face, assessments_completed, readiness } = response.data;
+      const { token: newToken, refresh_token, user_id, verified_face, assessments_completed, readiness } = response.data;
       
       await AsyncStorage.setItem('token', newToken);
+      await AsyncStorage.setItem('refresh_token', refresh_token);
       await AsyncStorage.setItem('user_id', user_id);
       
       setToken(newToken);
@@ -76,9 +77,10 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
   const register = async (data: any) => {
     try {
       const response = await authAPI.register(data);
-      const { token: newToken, user_id } = response.data;
+      const { token: newToken, refresh_token, user_id } = response.data;
       
       await AsyncStorage.setItem('token', newToken);
+      await AsyncStorage.setItem('refresh_token', refresh_token);
       await AsyncStorage.setItem('user_id', user_id);
       
       setToken(newToken);
@@ -89,7 +91,12 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
   };
 
   const logout = async () => {
+    const refreshToken = await AsyncStorage.getItem('refresh_token');
+    if (refreshToken) {
+      authAPI.logout(refreshToken).catch(() => {});
+    }
     await AsyncStorage.removeItem('token');
+    await AsyncStorage.removeItem('refresh_token');
     await AsyncStorage.removeItem('user_id');
     setToken(null);
     setUser(null);
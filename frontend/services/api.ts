@@ -26,12 +26,46 @@ api.interceptors.request.use(
   }
 );
 
-// Handle 401 errors
+// Access tokens are short-lived: trade the refresh token for a new pair once,
+// shared by every request that failed while the refresh was in flight
+let refreshing: Promise<string | null> | null = null;
+
+const refreshAccessToken = async (): Promise<string | null> => {
+  const refreshToken = await AsyncStorage.getItem('refresh_token');
+  if (!refreshToken) return null;
+  try {
+    const response = await axios.post(`${BACKEND_URL}/api/auth/refresh`, { refresh_token: refreshToken });
+    await AsyncStorage.setItem('token', response.data.token);
+    await AsyncStorage.setItem('refresh_token', response.data.refresh_token);
+    return response.data.token;
+  } catch {
+    return null;
+  }
+};
+
+// Keep access tokens reissued by endpoints that change profile claims
+// (assessment, face verification, location); handle 401 errors
 api.interceptors.response.use(
-  (response) => response,
+  async (response) => {
+    if (typeof response.data?.token === 'string') {
+      await AsyncStorage.setItem('token', response.data.token);
+    }
+    return response;
+  },
   async (error) => {
+    const original = error.config;
+    if (error.response?.status === 401 && original && !original._retried) {
+      original._retried = true;
+      refreshing = refreshing || refreshAccessToken().finally(() => { refreshing = null; });
+      const token = await refreshing;
+      if (token) {
+        original.headers.Authorization = `Bearer ${token}`;
+        return api(original);
+      }
+    }
     if (error.response?.status === 401) {
       await AsyncStorage.removeItem('token');
+      await AsyncStorage.removeItem('refresh_token');
       await AsyncStorage.removeItem('user_id');
       // Navigation will be handled by AuthContext
     }
@@ -41,10 +75,15 @@ api.interceptors.response.use(
 
 export default api;
 
+// Stored images come back as `/api/images/<sha256>` URLs; legacy ones as inline base64
+export const imageUri = (photo: string) =>
+  photo.startsWith('/api/') ? `${BACKEND_URL}${photo}` : `data:image/jpeg;base64,${photo}`;
+
 // Auth API
 export const authAPI = {
   register: (data: any) => api.post('/auth/register', data),
   login: (data: any) => api.post('/auth/login', data),
+  logout: (refreshToken: string) => api.post('/auth/logout', { refresh_token: refreshToken }),
   verifyFace: (selfie: string) => api.post('/auth/verify-face', { selfie_photo: selfie }),
 };
 
@@ -59,7 +98,9 @@ export const assessmentAPI = {
 export const discoveryAPI = {
   getUsers: (radius: number, page: number) => api.get(`/discover?radius=${radius}&page=${page}`),
   likeUser: (userId: string) => api.post('/like', { target_user_id: userId }),
-  getMatches: () => api.get('/matches'),
+  passUser: (userId: string) => api.post('/pass', { target_user_id: userId }),
+  swipeBatch: (swipes: { target_user_id: string; action: 'like' | 'pass' }[]) => api.post('/swipes/batch', { swipes }),
+  getMatches: (page: number = 1) => api.get(`/matches?page=${page}`),
 };
 
 // Chat API
@@ -0,0 +1,38 @@
+"""
+Shared pytest setup: backend modules are imported as the server imports
+them (`from services.x import ...`), and tests that need MongoDB get a
+throwaway database on MONGO_URL or are skipped.
+"""
+
+import asyncio
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+def run_with_db(test):
+    """Run `await test(db)` against a fresh database, dropped afterwards"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pymongo.errors import PyMongoError
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+                                    serverSelectionTimeoutMS=1000)
+        try:
+            await client.admin.command("ping")
+        except PyMongoError:
+            client.close()
+            pytest.skip("MongoDB not reachable on MONGO_URL")
+        db = client[f"miluv_test_{uuid.uuid4().hex[:12]}"]
+        try:
+            await test(db)
+        finally:
+            await client.drop_database(db.name)
+            client.close()
+
+    asyncio.run(main())
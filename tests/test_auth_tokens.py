@@ -0,0 +1,15 @@
+"""Access token claims go stale on a user change and fresh on reissue"""
+
+from services.auth_tokens import TokenService
+
+
+def test_reissued_token_is_fresh_after_change():
+    tokens = TokenService(db=None, secret_key="test")
+    old = tokens.verify_access(tokens.issue_access("u1", {"verified_face": False}))
+    assert tokens.claims_fresh(old)
+
+    tokens.mark_stale("u1")
+    new = tokens.verify_access(tokens.issue_access("u1", {"verified_face": True}))
+    assert not tokens.claims_fresh(old)
+    assert tokens.claims_fresh(new)
+    assert new["claims"]["verified_face"] is True
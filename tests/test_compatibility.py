@@ -0,0 +1,75 @@
+"""Vectorized compatibility scorer must match the scalar one exactly"""
+
+import random
+
+from services.compatibility import (
+    MBTI_CODES,
+    TRAIT_VOCABULARY,
+    UNENCODABLE,
+    batch_compatibility_scores,
+    calculate_compatibility_score,
+    encode_traits,
+)
+
+# Values the scalar scorer accepts but the codes cannot represent
+ODD_VALUES = {
+    "mbti": ["", "intj", "XXXX"],
+    "love_language": ["", "Cuddles"],
+    "temperament": [""],
+    "disc": ["", "Unknown"],
+}
+
+
+def random_user(rng: random.Random, odd: bool = False) -> dict:
+    user = {
+        "mbti": rng.choice(list(MBTI_CODES) + [None]),
+        "readiness": rng.choice([0, None, 100, rng.uniform(0, 100), rng.randint(1, 100)]),
+    }
+    for trait, vocabulary in TRAIT_VOCABULARY.items():
+        user[trait] = rng.choice(list(vocabulary))
+    if odd and rng.random() < 0.3:
+        trait = rng.choice(list(ODD_VALUES))
+        user[trait] = rng.choice(ODD_VALUES[trait])
+    return user
+
+
+def assert_identical(me: dict, candidates: list):
+    expected = [calculate_compatibility_score(me, candidate) for candidate in candidates]
+    assert batch_compatibility_scores(me, candidates) == expected
+
+
+def test_batch_matches_scalar_with_stored_codes():
+    rng = random.Random(1)
+    candidates = [random_user(rng) for _ in range(2000)]
+    for candidate in candidates:
+        candidate["trait_codes"] = encode_traits(candidate)
+    for _ in range(20):
+        me = random_user(rng)
+        me["trait_codes"] = encode_traits(me)
+        assert_identical(me, candidates)
+
+
+def test_batch_matches_scalar_without_stored_codes():
+    rng = random.Random(2)
+    candidates = [random_user(rng) for _ in range(2000)]
+    for _ in range(20):
+        assert_identical(random_user(rng), candidates)
+
+
+def test_unencodable_values_fall_back_to_scalar():
+    rng = random.Random(3)
+    candidates = [random_user(rng, odd=True) for _ in range(2000)]
+    assert any(encode_traits(candidate) == UNENCODABLE for candidate in candidates)
+    for _ in range(20):
+        assert_identical(random_user(rng, odd=True), candidates)
+
+
+def test_new_user_codes():
+    # Fresh registrations: nothing taken yet
+    codes = encode_traits({"mbti": None, "love_language": None, "readiness": 0, "temperament": None, "disc": None})
+    assert codes != UNENCODABLE
+    assert encode_traits({}) == codes
+
+
+def test_empty_block():
+    assert batch_compatibility_scores(random_user(random.Random(4)), []) == []
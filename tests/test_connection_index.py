@@ -0,0 +1,62 @@
+"""ConnectionIndex bookkeeping for connects, disconnects, devices and rooms"""
+
+from services.connection_index import ConnectionIndex
+
+
+def test_connect_and_disconnect():
+    index = ConnectionIndex()
+    assert index.connect("s1", "alice") is True
+    assert index.user("s1") == "alice"
+    assert index.is_connected("alice")
+
+    assert index.disconnect("s1") == ("alice", True, [])
+    assert index.user("s1") is None
+    assert not index.is_connected("alice")
+    assert index.stats() == {"sids": 0, "users": 0, "rooms": 0}
+
+
+def test_unknown_sid_disconnect_is_harmless():
+    index = ConnectionIndex()
+    index.connect("s1", "alice")
+    assert index.disconnect("nope") == (None, False, [])
+    assert index.disconnect("s1") == ("alice", True, [])
+    assert index.disconnect("s1") == (None, False, [])
+
+
+def test_multiple_devices():
+    index = ConnectionIndex()
+    assert index.connect("phone", "alice") is True
+    assert index.connect("tablet", "alice") is False
+    assert index.sids("alice") == {"phone", "tablet"}
+    assert index.users() == {"alice": {"phone", "tablet"}}
+
+    assert index.disconnect("phone") == ("alice", False, [])
+    assert index.is_connected("alice")
+    assert index.disconnect("tablet") == ("alice", True, [])
+    assert index.users() == {}
+
+
+def test_room_membership_counts_devices():
+    index = ConnectionIndex()
+    index.connect("phone", "alice")
+    index.connect("tablet", "alice")
+    index.connect("s3", "bob")
+
+    assert index.join("phone", "match1", "alice") is True
+    assert index.join("phone", "match1", "alice") is False  # already in
+    assert index.join("tablet", "match1", "alice") is False  # another device
+    assert index.join("s3", "match1", "bob") is True
+    assert index.room_users("match1") == {"alice", "bob"}
+    assert index.rooms("phone") == {"match1"}
+
+    assert index.leave("phone", "match1") is False  # tablet still there
+    assert index.leave("phone", "match1") is False  # not in it any more
+    assert index.room_users("match1") == {"alice", "bob"}
+
+    # Disconnecting the last device in a room reports the room as left,
+    # while alice stays connected on the phone
+    assert index.disconnect("tablet") == ("alice", False, ["match1"])
+    assert index.room_users("match1") == {"bob"}
+    assert index.disconnect("s3") == ("bob", True, ["match1"])
+    assert index.room_users("match1") == set()
+    assert index.stats() == {"sids": 1, "users": 1, "rooms": 0}
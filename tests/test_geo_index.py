@@ -0,0 +1,42 @@
+"""GeoIndex must return exactly the users a full haversine scan finds"""
+
+import random
+
+from services.geo_index import GeoIndex, haversine_km
+
+
+def brute_force(points: dict, latitude: float, longitude: float, radius_km: float) -> set:
+    return {
+        user_id for user_id, (lat, lon) in points.items()
+        if haversine_km(latitude, longitude, lat, lon) <= radius_km
+    }
+
+
+def test_within_matches_linear_scan():
+    rng = random.Random(3)
+    index = GeoIndex()
+    points = {}
+    for i in range(5000):
+        points[str(i)] = (-6.2 + rng.uniform(-1, 1), 106.8 + rng.uniform(-1, 1))
+        index.upsert(str(i), *points[str(i)])
+
+    for radius in (1, 10, 50, 300):
+        lat, lon = -6.2 + rng.uniform(-0.5, 0.5), 106.8 + rng.uniform(-0.5, 0.5)
+        found = dict(index.within(lat, lon, radius))
+        assert set(found) == brute_force(points, lat, lon, radius)
+        for user_id, distance in found.items():
+            assert abs(distance - haversine_km(lat, lon, *points[user_id])) < 1e-6
+
+
+def test_antimeridian_moves_and_exclude():
+    index = GeoIndex()
+    index.upsert("west", -17.0, 179.95)
+    index.upsert("east", -17.0, -179.95)
+    index.upsert("me", -17.0, 179.99)
+    assert {user_id for user_id, _ in index.within(-17.0, 179.99, 20, exclude="me")} == {"west", "east"}
+
+    index.upsert("east", 10.0, 10.0)
+    index.remove("west")
+    assert index.within(-17.0, 179.99, 20, exclude="me") == []
+    assert [user_id for user_id, _ in index.within(10.0, 10.0, 1)] == ["east"]
+    assert len(index) == 2
@@ -0,0 +1,54 @@
+"""Index registry against a real MongoDB: duplicates cleared, indexes built,
+every registered query shape served by an index"""
+
+from bson import ObjectId
+
+from services.indexes import (
+    QUERY_SHAPES,
+    apply_indexes,
+    dedupe_unique_indexes,
+    explain_query_shapes,
+    index_report,
+)
+
+from .conftest import run_with_db
+
+
+def test_query_shapes_use_indexes():
+    async def test(db):
+        result = await apply_indexes(db)
+        assert result["failed"] == {}
+        assert all(not report["missing"] for report in (await index_report(db)).values())
+
+        explained = await explain_query_shapes(db)
+        assert [result["name"] for result in explained] == [shape["name"] for shape in QUERY_SHAPES]
+        assert [result["name"] for result in explained if not result["covered"]] == []
+
+    run_with_db(test)
+
+
+def test_dedupe_keeps_oldest_and_reports_users():
+    async def test(db):
+        oldest, newer = ObjectId(), ObjectId()
+        await db.likes.insert_many([
+            {"_id": oldest, "from_user_id": "a", "to_user_id": "b"},
+            {"_id": newer, "from_user_id": "a", "to_user_id": "b"},
+            {"from_user_id": "a", "to_user_id": "c"},
+        ])
+        first_user, second_user = ObjectId(), ObjectId()
+        await db.users.insert_many([
+            {"_id": first_user, "email": "x@example.com", "username": "x"},
+            {"_id": second_user, "email": "x@example.com", "username": "y"},
+        ])
+
+        result = await dedupe_unique_indexes(db, ["likes", "users"])
+        assert result["removed"] == {"likes.from_user_id_1_to_user_id_1": 1}
+        assert result["conflicts"] == {"users.email_1": [[str(first_user), str(second_user)]]}
+        assert await db.likes.find_one({"_id": newer}) is None
+        assert await db.likes.count_documents({}) == 2
+        assert await db.users.count_documents({}) == 2
+
+        applied = await apply_indexes(db, ["likes", "users"])
+        assert list(applied["failed"]) == ["users.email_1"]
+
+    run_with_db(test)
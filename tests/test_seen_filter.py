@@ -0,0 +1,96 @@
+"""Seen filters: swiped users always stay hidden, unseen ones only rarely"""
+
+from bson import ObjectId
+
+from services.seen_filter import BloomFilter, SeenStore
+
+from .conftest import run_with_db
+
+
+def test_bloom_filter_has_no_false_negatives():
+    seen = BloomFilter(capacity=1000)
+    added = [str(ObjectId()) for _ in range(1000)]
+    for key in added:
+        seen.add(key)
+    assert all(key in seen for key in added)
+    assert not seen.full
+
+
+def test_bloom_filter_false_positive_rate():
+    seen = BloomFilter(capacity=1000, error_rate=0.01)
+    for _ in range(1000):
+        seen.add(str(ObjectId()))
+    probes = 20000
+    false_positives = sum(str(ObjectId()) in seen for _ in range(probes))
+    assert false_positives / probes < 0.02
+
+
+def test_bloom_filter_document_round_trip():
+    seen = BloomFilter(capacity=100)
+    added = [str(ObjectId()) for _ in range(100)]
+    for key in added:
+        seen.add(key)
+    loaded = BloomFilter.from_document(seen.to_document())
+    assert loaded.words == seen.words
+    assert loaded.count == 100
+    assert all(key in loaded for key in added)
+
+
+def test_seen_store_add_persists_bits():
+    async def test(db):
+        store = SeenStore(db, capacity=50)
+        targets = [str(ObjectId()) for _ in range(40)]
+        await store.add("me", targets[:20])
+        await store.add("me", targets[20:])
+
+        # A second process sees the same filter without the first one's cache
+        other = await SeenStore(db, capacity=50).get("me")
+        assert all(target in other for target in targets)
+        assert other.count == 40
+
+    run_with_db(test)
+
+
+def test_seen_store_rebuilds_from_swipes_when_full():
+    async def test(db):
+        targets = [str(ObjectId()) for _ in range(30)]
+        await db.likes.insert_many([{"from_user_id": "me", "to_user_id": t} for t in targets[:15]])
+        await db.passes.insert_many([{"from_user_id": "me", "to_user_id": t} for t in targets[15:]])
+
+        store = SeenStore(db, capacity=10)
+        seen = await store.get("me")
+        assert seen.capacity >= 30
+        assert all(target in seen for target in targets)
+
+        # Overflowing the filter rebuilds it at twice the size from likes/passes
+        extra = [str(ObjectId()) for _ in range(seen.capacity)]
+        await db.likes.insert_many([{"from_user_id": "me", "to_user_id": t} for t in extra])
+        await store.add("me", extra)
+        rebuilt = await SeenStore(db).get("me")
+        assert rebuilt.capacity == 2 * seen.capacity
+        assert all(target in rebuilt for target in targets + extra)
+
+    run_with_db(test)
+
+
+def test_seen_store_add_after_rebuild_elsewhere():
+    async def test(db):
+        stale, other = SeenStore(db, capacity=10), SeenStore(db, capacity=10)
+        assert (await stale.get("me")).capacity == 10
+
+        # Another process overflows the filter and rebuilds it at twice the size
+        targets = [str(ObjectId()) for _ in range(11)]
+        await db.likes.insert_many([{"from_user_id": "me", "to_user_id": t} for t in targets])
+        await other.add("me", targets)
+
+        # The stale copy's bit positions no longer match; the add must still land
+        late = str(ObjectId())
+        await db.likes.insert_one({"from_user_id": "me", "to_user_id": late})
+        await stale.add("me", [late])
+
+        persisted = await SeenStore(db).get("me")
+        assert persisted.capacity == 20
+        assert all(target in persisted for target in targets + [late])
+        assert persisted.count == 12
+
+    run_with_db(test)
@@ -0,0 +1,103 @@
+"""Two Socket.IO servers sharing a MemoryManager channel behave as one cluster"""
+
+import asyncio
+import uuid
+
+import pytest
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+from services.socket_cluster import ClusterManagerMixin, MemoryManager
+
+PRESENCE_INTERVAL = 0.1
+
+
+def make_server(channel: str) -> socketio.AsyncServer:
+    manager = MemoryManager(channel=channel, presence_interval=PRESENCE_INTERVAL)
+    server = socketio.AsyncServer(async_mode="asgi", client_manager=manager)
+    # Normally done on the first engine.io connection
+    server.manager_initialized = True
+    manager.initialize()
+    return server
+
+
+async def eventually(predicate, timeout: float = 2.0) -> bool:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            return False
+        await asyncio.sleep(0.02)
+    return True
+
+
+def capture_packets(server: socketio.AsyncServer) -> list:
+    """Engine.io packets the server sends, as (eio_sid, decoded socket.io data)"""
+    sent = []
+
+    async def send_packet(eio_sid, pkt):
+        sent.append((eio_sid, socketio.packet.Packet(encoded_packet=pkt.data).data))
+
+    server.eio.send_packet = send_packet
+    return sent
+
+
+def test_receive_is_abstract():
+    class NoReceive(ClusterManagerMixin, AsyncPubSubManager):
+        pass
+
+    with pytest.raises(TypeError):
+        NoReceive()
+
+
+def test_presence_propagates_between_servers():
+    async def main():
+        channel = uuid.uuid4().hex
+        first, second = make_server(channel), make_server(channel)
+        await asyncio.sleep(0)  # let both subscribe
+
+        await first.manager.presence.connected("alice")
+        assert await eventually(lambda: second.manager.presence.is_online("alice"))
+
+        # A second device keeps alice online until both are gone
+        await first.manager.presence.connected("alice")
+        await first.manager.presence.disconnected("alice")
+        await asyncio.sleep(2 * PRESENCE_INTERVAL)
+        assert second.manager.presence.is_online("alice")
+
+        await first.manager.presence.disconnected("alice")
+        assert await eventually(lambda: not second.manager.presence.is_online("alice"))
+
+    asyncio.run(main())
+
+
+def test_late_server_gets_snapshot():
+    async def main():
+        channel = uuid.uuid4().hex
+        first = make_server(channel)
+        await asyncio.sleep(0)
+        await first.manager.presence.connected("bob")
+
+        late = make_server(channel)
+        assert await eventually(lambda: late.manager.presence.online_users() == {"bob"})
+        assert late.manager.presence.stats()["hosts"] == 2
+
+    asyncio.run(main())
+
+
+def test_room_emit_fans_out_to_other_server():
+    async def main():
+        channel = uuid.uuid4().hex
+        sender, receiver = make_server(channel), make_server(channel)
+        sent = capture_packets(receiver)
+        await asyncio.sleep(0)
+
+        sid = await receiver.manager.connect("eio-bob", "/")
+        await receiver.manager.enter_room(sid, "/", "match1")
+        await receiver.manager.connect("eio-carol", "/")  # not in the room
+
+        await sender.emit("new_message", {"message_id": "m1"}, room="match1")
+        assert await eventually(lambda: sent)
+        await asyncio.sleep(2 * PRESENCE_INTERVAL)
+        assert sent == [("eio-bob", ["new_message", {"message_id": "m1"}])]
+
+    asyncio.run(main())